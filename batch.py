@@ -0,0 +1,223 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from catalog import MealCatalog
+from config import bcolors
+from customer import Customer
+from exporters import CSVExporter, export_format, open_exporter, round_floats
+from metrics import Metrics, MetricsRegistry, TraceRecorder
+from meal_plan import MealPlan
+from optimizer import MealOptimizer
+from pdf_builder import PDFBuilder
+from plan_store import PlanStore
+
+CHUNK_SIZE = 500
+
+def read_customers(path : str) -> list:
+    """
+    Reads customer profiles and preferences from a CSV or JSONL file.
+    Parameters:
+    - path (str): Path to the file.  Each CSV row or JSON line is one record as accepted by Customer.from_record.
+    Returns:
+    - list[Customer]: The customers, in file order.
+    Raises:
+    - ValueError: If the file is neither CSV nor JSONL.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline='') as f:
+        if extension == '.csv':
+            records = list(csv.DictReader(f))
+        elif extension in ('.jsonl', '.ndjson'):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            raise ValueError(f"Unsupported customer file {path}, expected .csv or .jsonl")
+    return [Customer.from_record(record) for record in records]
+
+def iter_batch(customers : list, workers : int = 1, seed : int = None, chunk_size : int = CHUNK_SIZE, documents_dir : str = None, time_budget : float = None):
+    """
+    Generates the plans of the given customers in chunks spread over a pool of worker processes.
+
+    Every chunk draws from its own child of the seed's SeedSequence, so the plans only depend on the seed and the
+    chunk size, never on the number of workers or the order in which the workers finish.
+    Parameters:
+    - customers (list[Customer]): The customers to generate plans for.
+    - workers (int): Number of worker processes.  With 1, the chunks are generated in this process.
+    - seed (int): Seed of the random generator, for reproducible batches.
+    - chunk_size (int): Number of customers per chunk.
+    - documents_dir (str): If given, the LaTeX document of every plan is also written to this directory.
+    - time_budget (float): If given, meals are chosen by the MealOptimizer with this many seconds per plan.
+    Yields:
+    - pandas.DataFrame: The plans of each chunk, in customer order.
+    """
+    yield from _map_chunks(_plan_chunk, customers, workers, seed, chunk_size, documents_dir, time_budget)
+
+def _map_chunks(function, customers : list, workers : int, seed, chunk_size : int, documents_dir : str, time_budget : float, registry : MetricsRegistry = None):
+    """
+    Applies the function to every chunk of customers and yields the results in order.
+
+    If a registry is given, the measurements taken in worker processes are merged into it as their chunks finish.
+    """
+    assert workers >= 1, "Number of workers must be at least 1"
+    assert chunk_size >= 1, "Chunk size must be at least 1"
+    chunks = [customers[i:i + chunk_size] for i in range(0, len(customers), chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    if documents_dir is not None:
+        os.makedirs(documents_dir, exist_ok=True)
+    arguments = [(chunk, chunk_seed, documents_dir, time_budget) for chunk, chunk_seed in zip(chunks, seeds)]
+
+    if workers == 1 or len(chunks) <= 1:
+        for args in arguments:
+            yield function(args)
+        return
+
+    # Compile the catalog cache here if it is cold, so the workers only memory-map the finished cache.
+    MealCatalog.get()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        if registry is None:
+            yield from executor.map(function, arguments)
+            return
+        for result, snapshot in executor.map(partial(_measured_chunk, function), arguments):
+            registry.merge(snapshot)
+            yield result
+
+def _init_worker():
+    """
+    Loads the shared catalog once per worker process, from the cache compiled by the parent.
+    """
+    # Forked workers inherit the parent's hooks, whose measurements would never reach the parent.
+    for hook in Metrics.hooks:
+        Metrics.remove_hook(hook)
+    MealCatalog.get()
+
+def _measured_chunk(function, args):
+    """
+    Applies the function to one chunk in a worker process and measures it.
+    Returns:
+    - tuple: The result of the function and the snapshot of its measurements.
+    """
+    registry = Metrics.add_hook(MetricsRegistry())
+    try:
+        result = function(args)
+    finally:
+        Metrics.remove_hook(registry)
+    return result, registry.snapshot()
+
+def _plan_chunk(args):
+    """
+    Generates the plans of one chunk of customers, and their documents if a directory is given.
+    """
+    customers, seed, documents_dir, time_budget = args
+    optimizer = MealOptimizer(time_budget=time_budget) if time_budget is not None else None
+    plans = MealPlan.generate_batch(customers, seed=seed, optimizer=optimizer)
+    if documents_dir is not None:
+        _write_documents(customers, plans, documents_dir)
+    return plans
+
+def _csv_chunk(args):
+    """
+    Generates the plans of one chunk of customers as CSV text, so the formatting is also spread over the workers.
+    Returns:
+    - tuple: The CSV header line, the number of meals and the CSV rows without header.
+    """
+    plans = _plan_chunk(args)
+    header, rows = CSVExporter.format(plans)
+    return header, len(plans), rows
+
+def _store_chunk(store_path : str, args):
+    """
+    Generates the plans of one chunk of customers and writes them to the plan store, so the workers write
+    concurrently instead of sending their plans to the main process.
+    Returns:
+    - int: The number of meals stored.
+    """
+    plans = _plan_chunk(args)
+    with PlanStore(store_path) as store:
+        return store.save(round_floats(plans))
+
+def _write_documents(customers : list, plans, documents_dir : str):
+    """
+    Writes the LaTeX document of every customer's plan to the documents directory.
+    """
+    from document_generator import DocumentGenerator
+
+    plans_by_customer = dict(tuple(plans.groupby('Customer', sort=False)))
+    for customer in customers:
+        customer_id = customer.customer_id or customer.profile['name']
+        if customer_id not in plans_by_customer:
+            continue
+        meal_plan = MealPlan.from_meals(customer, plans_by_customer[customer_id])
+        DocumentGenerator.generate_tex(meal_plan, PDFBuilder.output_path(customer, documents_dir))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generates the meal plans of many customers in one pass.")
+    parser.add_argument('customers', help="CSV or JSONL file of customer profiles and preferences")
+    parser.add_argument('-o', '--output', default='output/meal_plans.csv', help="File to write all plans to: .csv, .jsonl, .parquet, .arrow, or a .sqlite plan store to add them to")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for reproducible plans")
+    parser.add_argument('--workers', type=int, default=1, help="Number of worker processes (default: 1)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help=f"Customers per worker task (default: {CHUNK_SIZE})")
+    parser.add_argument('--documents', default=None, metavar='DIR', help="Also write the LaTeX document of every plan to DIR")
+    parser.add_argument('--pdf', action='store_true', help="Also compile the documents to PDF, on every core (requires --documents)")
+    parser.add_argument('--trace', default=None, metavar='FILE', help="Write a JSON trace of the pipeline stages to FILE (stages run in worker processes are not traced)")
+    parser.add_argument('--metrics', default=None, metavar='FILE', help="Write the stage timings and counters to FILE in the Prometheus text format (stage timings of worker processes are added up)")
+    parser.add_argument('--optimize', action='store_true', help="Choose meals to meet each customer's macro targets instead of at random")
+    parser.add_argument('--time-budget', type=float, default=0.01, help="Seconds per plan the optimizer may spend improving it (default: 0.01)")
+    args = parser.parse_args(argv)
+    if args.pdf and args.documents is None:
+        parser.error("--pdf requires --documents")
+
+    registry = Metrics.add_hook(MetricsRegistry()) if args.metrics else None
+    trace = Metrics.add_hook(TraceRecorder()) if args.trace else None
+
+    start = time.perf_counter()
+    customers = read_customers(args.customers)
+    time_budget = args.time_budget if args.optimize else None
+    chunk_args = (customers, args.workers, args.seed, args.chunk_size, args.documents, time_budget, registry)
+    if export_format(args.output) == 'sqlite':
+        # Create the store before the workers open it concurrently.
+        PlanStore(args.output).close()
+        num_meals = sum(_map_chunks(partial(_store_chunk, args.output), *chunk_args))
+    else:
+        with open_exporter(args.output) as exporter:
+            if isinstance(exporter, CSVExporter):
+                for header, chunk_meals, rows in _map_chunks(_csv_chunk, *chunk_args):
+                    exporter.write_formatted(header, rows, chunk_meals)
+            else:
+                for plans in _map_chunks(_plan_chunk, *chunk_args):
+                    exporter.write(plans)
+            num_meals = exporter.rows
+    elapsed = time.perf_counter() - start
+
+    print(f"{bcolors.OKGREEN}{len(customers)} meal plans ({num_meals} meals) saved to {os.path.abspath(args.output)} in {elapsed:.2f}s{bcolors.ENDC}")
+    if args.pdf:
+        _build_pdfs(customers, args.documents)
+    if registry is not None:
+        with open(args.metrics, 'w') as f:
+            f.write(registry.prometheus_text())
+    if trace is not None:
+        trace.dump(args.trace)
+
+def _build_pdfs(customers : list, documents_dir : str) -> None:
+    """
+    Compiles the LaTeX documents written for the customers, reusing the PDFs of sources built before.
+    """
+    start = time.perf_counter()
+    filepaths = [PDFBuilder.output_path(customer, documents_dir) for customer in customers]
+    filepaths = [filepath for filepath in dict.fromkeys(filepaths) if os.path.exists(filepath + '.tex')]
+    with PDFBuilder() as builder:
+        results = builder.build_files(filepaths)
+    failures = [result for result in results if isinstance(result, Exception)]
+    elapsed = time.perf_counter() - start
+
+    print(f"{bcolors.OKGREEN}{len(results) - len(failures)} PDF documents built in {documents_dir} in {elapsed:.2f}s{bcolors.ENDC}")
+    if failures:
+        print(f"{bcolors.FAIL}{len(failures)} documents failed to build: {failures[0]}{bcolors.ENDC}")
+
+if __name__ == "__main__":
+    main()
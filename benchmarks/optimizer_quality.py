@@ -0,0 +1,79 @@
+"""
+Quality and latency benchmark of the meal optimizer against random sampling.
+
+Run from the repository root:
+    python -m benchmarks.optimizer_quality --customers 10000 --days 28
+In the shipped catalog, all the meals of a type have the same macro split, so no choice of meals can bring a plan
+closer to its target.  With --synthetic N, the plans are drawn from a synthetic catalog of N meals whose macro splits
+vary within each type (see benchmarks.suite.synthetic_catalog), where the optimizer has room to improve them.
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from catalog import MealCatalog
+from config import MealType, MealObjective, MealFrequency, MACRO_TARGETS
+from customer import Customer
+from meal_plan import MealPlan
+from optimizer import MealOptimizer
+
+def random_customers(count : int, days : int, rng : np.random.Generator) -> list:
+    """
+    Creates customers with random preferences, all starting tomorrow.
+    """
+    starting_date = (date.today() + timedelta(days=1)).isoformat()
+    allergens = ['CHICKEN', 'BEEF', 'PORK', 'SEAFOOD']
+    customers = []
+    for i in range(count):
+        customers.append(Customer.from_record({
+            "id": f"C{i:06d}",
+            "name": f"Customer {i}",
+            "age": int(rng.integers(18, 70)),
+            "gender": str(rng.choice(['MALE', 'FEMALE'])),
+            "type": str(rng.choice(list(MealType.__members__))),
+            "objective": str(rng.choice(list(MealObjective.__members__))),
+            "frequency": str(rng.choice(list(MealFrequency.__members__))),
+            "starting_date": starting_date,
+            "duration": days,
+            "allergies": list(rng.choice(allergens, size=int(rng.integers(0, 2)), replace=False)),
+        }))
+    return customers
+
+def macro_error(customers : list, plans : pd.DataFrame) -> float:
+    """
+    Returns the mean absolute deviation of the plans' daily macro split from their objective's target, in percentage points.
+    """
+    objectives = pd.Series({customer.customer_id: customer.objective for customer in customers})
+    daily = plans.groupby(['Customer', plans['Date'].dt.date])[list(MealCatalog.MACRO_COLUMNS)].mean()
+    targets = np.array([MACRO_TARGETS[objective] for objective in objectives[daily.index.get_level_values(0)]])
+    return float(np.abs(daily.to_numpy() - targets).mean())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quality and latency benchmark of the meal optimizer.")
+    parser.add_argument('--customers', type=int, default=1000, help="Number of plans to generate (default: 1000)")
+    parser.add_argument('--days', type=int, default=28, help="Duration of every plan in days (default: 28)")
+    parser.add_argument('--time-budget', type=float, default=0.01, help="Optimizer seconds per plan (default: 0.01)")
+    parser.add_argument('--synthetic', type=int, default=None, metavar='N', help="Plan from a synthetic catalog of N meals with varied macro splits instead of the shipped catalog")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.synthetic is not None:
+        from benchmarks.suite import synthetic_catalog
+        catalog = synthetic_catalog(args.synthetic, seed=args.seed)
+    else:
+        catalog = MealCatalog.get()
+    customers = random_customers(args.customers, args.days, np.random.default_rng(args.seed))
+    optimizer = MealOptimizer(catalog, time_budget=args.time_budget)
+
+    print(f"{'mode':<10}{'seconds':>10}{'plans/s':>12}{'macro error (pp)':>20}")
+    for mode, plan_optimizer in (('random', None), ('optimized', optimizer)):
+        start = time.perf_counter()
+        plans = MealPlan.generate_batch(customers, catalog=catalog, seed=args.seed, optimizer=plan_optimizer)
+        elapsed = time.perf_counter() - start
+        print(f"{mode:<10}{elapsed:>10.2f}{len(customers) / elapsed:>12.0f}{macro_error(customers, plans):>20.2f}")
+
+if __name__ == "__main__":
+    main()
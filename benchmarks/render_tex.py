@@ -0,0 +1,70 @@
+"""
+Benchmark of the streaming LaTeX writer against the pylatex document tree.
+
+Run from the repository root:
+    python -m benchmarks.render_tex --plans 50 --days 28
+"""
+import argparse
+import io
+import time
+from datetime import date, timedelta
+
+from catalog import MealCatalog
+from customer import Customer
+from document_generator import DocumentGenerator
+from meal_plan import MealPlan
+
+def sample_plans(count : int, days : int) -> list:
+    """
+    Generates THMAD plans, the frequency with the most meals per day, for `count` customers.
+    """
+    starting_date = (date.today() + timedelta(days=1)).isoformat()
+    plans = []
+    for i in range(count):
+        customer = Customer.from_record({
+            "name": f"Customer & Co. {i}",
+            "age": 30,
+            "gender": "FEMALE",
+            "type": "KETO",
+            "objective": "WEIGHT_LOSS",
+            "frequency": "THMAD",
+            "starting_date": starting_date,
+            "duration": days,
+        })
+        meal_plan = MealPlan(customer)
+        meal_plan.generate_meal_plan(seed=i)
+        plans.append(meal_plan)
+    return plans
+
+def render_pylatex(meal_plan) -> str:
+    return DocumentGenerator.generate_document_from_meal_plan(meal_plan).dumps()
+
+def render_streaming(meal_plan) -> str:
+    buffer = io.StringIO()
+    DocumentGenerator.write_tex(meal_plan, buffer)
+    return buffer.getvalue()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the LaTeX renderers.")
+    parser.add_argument('--plans', type=int, default=50, help="Number of plans to render (default: 50)")
+    parser.add_argument('--days', type=int, default=28, help="Duration of every plan in days (default: 28)")
+    args = parser.parse_args(argv)
+
+    MealCatalog.get()
+    plans = sample_plans(args.plans, args.days)
+
+    outputs = {}
+    print(f"{'renderer':<12}{'seconds':>10}{'ms/plan':>10}")
+    for name, render in (('pylatex', render_pylatex), ('streaming', render_streaming)):
+        start = time.perf_counter()
+        outputs[name] = [render(meal_plan) for meal_plan in plans]
+        elapsed = time.perf_counter() - start
+        print(f"{name:<12}{elapsed:>10.3f}{elapsed / len(plans) * 1000:>10.2f}")
+
+    identical = outputs['pylatex'] == outputs['streaming']
+    print(f"Outputs are {'byte-identical' if identical else 'DIFFERENT'}")
+    if not identical:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
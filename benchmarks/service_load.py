@@ -0,0 +1,125 @@
+"""
+Load test of the plan service.  Sends plan requests over keep-alive connections and reports latency percentiles.
+
+Run from the repository root:
+    python -m benchmarks.service_load --requests 1000 --concurrency 16
+Without --url, a service is started on a free local port for the duration of the test.
+"""
+import argparse
+import asyncio
+import json
+import re
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+import numpy as np
+
+SAMPLE_CUSTOMER = {
+    "name": "Load Test",
+    "age": 30,
+    "gender": "FEMALE",
+    "type": "KETO",
+    "objective": "WEIGHT_LOSS",
+    "frequency": "THMAD",
+    "starting_date": (date.today() + timedelta(days=1)).isoformat(),
+    "duration": 28,
+    "allergies": ["PORK"],
+}
+
+async def _client(host : str, port : int, path : str, body : bytes, count : int, latencies : list, errors : list) -> None:
+    """
+    Sends `count` requests one after another over a single connection and records their latencies.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    request = (
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode() + body
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if not status_line.startswith(b'HTTP/1.1 200'):
+                errors.append(status_line.decode('latin-1').strip())
+    finally:
+        writer.close()
+
+async def run(url : str, requests : int, concurrency : int, output_format : str) -> dict:
+    """
+    Runs the load test against the service at the given URL.
+    Returns:
+    - dict: Number of requests and errors, throughput and latency percentiles in milliseconds.
+    """
+    parts = urlsplit(url)
+    path = f"/plans?format={output_format}"
+    body = json.dumps(SAMPLE_CUSTOMER).encode()
+    latencies, errors = [], []
+    per_client = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+
+    start = time.perf_counter()
+    await asyncio.gather(*[_client(parts.hostname, parts.port, path, body, count, latencies, errors) for count in per_client if count])
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'max_ms': float(latencies_ms.max()),
+    }
+
+def _start_service():
+    """
+    Starts the service on a free local port.
+    Returns:
+    - tuple: The service process and its URL.
+    """
+    process = subprocess.Popen([sys.executable, 'service.py', '--port', '0'], stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    match = re.search(r'http://[\w.]+:\d+', line)
+    if match is None:
+        process.kill()
+        raise RuntimeError(f"Service did not start: {line!r}")
+    return process, match.group(0)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test of the plan service.")
+    parser.add_argument('--url', default=None, help="URL of a running service.  Starts a local one if omitted.")
+    parser.add_argument('--requests', type=int, default=500, help="Total number of requests (default: 500)")
+    parser.add_argument('--concurrency', type=int, default=8, help="Number of concurrent connections (default: 8)")
+    parser.add_argument('--format', default='json', choices=['json', 'csv'], help="Response format to request")
+    args = parser.parse_args(argv)
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = _start_service()
+    try:
+        report = asyncio.run(run(url, args.requests, args.concurrency, args.format))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print(f"{report['requests']} requests, {report['errors']} errors, {report['requests_per_second']:.1f} req/s")
+    print(f"p50 {report['p50_ms']:.2f} ms | p99 {report['p99_ms']:.2f} ms | max {report['max_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Load test of the interactive flow.  Replays scripted questionnaire sessions through main.main() in worker processes
+and reports sessions per second, session latency and the time spent in each stage of the pipeline.
+
+Run from the repository root:
+    python -m benchmarks.sessions --sessions 2000 --workers 4
+Sessions are random valid answers to the questionnaire, some of them modifying a preference after the preview.
+With --answers, every session replays the same answer file instead.  The plans the sessions save are written to a
+temporary directory.
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+from config import Allergen, Gender, MealFrequency, MealObjective, MealType
+from metrics import Metrics, MetricsRegistry
+from questionnaire_utils import QuestionnaireUtils
+
+DURATIONS = 3
+# Position of the frequency in the menu of Customer.confirm_preferences.
+FREQUENCY_OPTION = 4
+
+def scripted_session(rng : np.random.Generator, today : date) -> list:
+    """
+    Returns the answers of a random valid session, starting on a day after `today` in the same year.
+    """
+    start = today + timedelta(days=int(rng.integers(1, max(2, (date(today.year, 12, 31) - today).days + 1))))
+    answers = [
+        f"Session {rng.integers(1_000_000)}",
+        rng.integers(18, 80),
+        rng.integers(1, len(Gender) + 1),
+        rng.integers(1, len(MealObjective) + 1),
+        rng.integers(1, len(MealType) + 1),
+        start.month,
+        start.day,
+        rng.integers(1, DURATIONS + 1),
+        rng.integers(1, len(MealFrequency) + 1),
+        ','.join(str(allergen) for allergen in rng.choice(np.arange(1, len(Allergen) + 1), size=rng.integers(0, 3), replace=False)),
+    ]
+    if rng.random() < 0.2:
+        # Modify the frequency after the preview, then stop modifying.
+        answers += [1, FREQUENCY_OPTION, rng.integers(1, len(MealFrequency) + 1), 2]
+    else:
+        answers += [2]
+    # Do not generate the PDF document.
+    answers += [2]
+    return [str(answer) for answer in answers]
+
+def _init_worker(output_dir : str) -> None:
+    """
+    Loads the catalog once per worker process, then moves to the output directory so the saved plans land there.
+    """
+    from catalog import MealCatalog
+    importlib.import_module('meal_plan')
+    MealCatalog.get()
+    os.chdir(output_dir)
+
+def _run_sessions(sessions : list):
+    """
+    Replays sessions through main.main().
+    Returns:
+    - tuple: The latency of every session in seconds, the stage timings as (count, total seconds) by stage, and
+             the errors.
+    """
+    import main
+
+    registry = Metrics.add_hook(MetricsRegistry())
+    latencies, errors = [], []
+    try:
+        for answers in sessions:
+            QuestionnaireUtils.set_answers(answers)
+            start = time.perf_counter()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    main.main([])
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+            latencies.append(time.perf_counter() - start)
+    finally:
+        QuestionnaireUtils.set_answers(None)
+        Metrics.remove_hook(registry)
+    return latencies, registry.stages, errors
+
+def run(sessions : list, workers : int, chunk_size : int = 50) -> dict:
+    """
+    Replays the sessions in worker processes.
+    Returns:
+    - dict: Number of sessions and errors, throughput, session latency percentiles in milliseconds and the mean
+            milliseconds per stage call.
+    """
+    from catalog import MealCatalog
+    # Compile the catalog cache here if it is cold, so the workers only memory-map the finished cache.
+    MealCatalog.get()
+    output_dir = tempfile.mkdtemp(prefix='meal-plan-sessions-')
+    chunks = [sessions[i:i + chunk_size] for i in range(0, len(sessions), chunk_size)]
+    latencies, stages, errors = [], {}, []
+    try:
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(output_dir,)) as executor:
+            for chunk_latencies, chunk_stages, chunk_errors in executor.map(_run_sessions, chunks):
+                latencies += chunk_latencies
+                errors += chunk_errors
+                for stage, (count, total) in chunk_stages.items():
+                    previous_count, previous_total = stages.get(stage, (0, 0.0))
+                    stages[stage] = (previous_count + count, previous_total + total)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'sessions': len(latencies),
+        'errors': errors,
+        'sessions_per_second': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'max_ms': float(latencies_ms.max()),
+        'stages_ms': {stage: total / count * 1000 for stage, (count, total) in sorted(stages.items())},
+        'stage_calls': {stage: count for stage, (count, total) in sorted(stages.items())},
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test of the interactive flow with scripted sessions.")
+    parser.add_argument('--sessions', type=int, default=1000, help="Number of sessions (default: 1000)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes (default: one per core)")
+    parser.add_argument('--answers', default=None, metavar='FILE', help="JSON or YAML answer file to replay in every session")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random sessions (default: 0)")
+    args = parser.parse_args(argv)
+
+    if args.answers is not None:
+        sessions = [QuestionnaireUtils.load_answers(args.answers)] * args.sessions
+    else:
+        rng = np.random.default_rng(args.seed)
+        sessions = [scripted_session(rng, date.today()) for _ in range(args.sessions)]
+    report = run(sessions, args.workers)
+
+    print(f"{report['sessions']} sessions, {len(report['errors'])} errors, {report['sessions_per_second']:.1f} sessions/s on {args.workers} workers")
+    print(f"p50 {report['p50_ms']:.2f} ms | p99 {report['p99_ms']:.2f} ms | max {report['max_ms']:.2f} ms")
+    for stage, milliseconds in report['stages_ms'].items():
+        print(f"  {stage:<16} {milliseconds:8.3f} ms x {report['stage_calls'][stage]}")
+    if report['errors']:
+        print(f"First error: {report['errors'][0]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Benchmark suite of the meal plan pipeline on synthetic catalogs.
+
+Times every stage of a plan, from MealPlan construction to document rendering, for each combination of catalog
+size, frequency and duration, and reports throughput and peak memory.  Results can be stored as a baseline that
+later runs are compared against; stages slower than the baseline by more than the tolerance are flagged and the
+run exits with status 1.
+
+Run from the repository root:
+    python -m benchmarks.suite --save-baseline
+    python -m benchmarks.suite
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from catalog import MealCatalog
+from config import MealType, MealFrequency
+from customer import Customer
+from document_generator import DocumentGenerator
+from meal_plan import MealPlan
+
+BASELINE_PATH = "benchmarks/baseline.json"
+# Macro split of every meal type in the real catalog, which synthetic meals jitter around.
+TYPE_MACROS = {
+    MealType.KETO.value: (10, 30, 60),
+    MealType.ORGANIC.value: (20, 60, 20),
+    MealType.NON_ORGANIC.value: (20, 60, 20),
+    MealType.VEGAN.value: (60, 20, 20),
+}
+TYPE_PREFIXES = {MealType.KETO.value: 'K', MealType.ORGANIC.value: 'O', MealType.NON_ORGANIC.value: 'N', MealType.VEGAN.value: 'V'}
+INGREDIENTS = np.array(['Chicken', 'Beef', 'Seafood', 'Pork', 'Meat-Free'])
+# Differences below this many seconds are noise, whatever the ratio.
+NOISE_FLOOR = 1e-4
+# Seconds `import main` may take before the first question appears, and the modules it must not import.
+STARTUP_BUDGET = 0.05
+STARTUP_FORBIDDEN = ('pandas', 'numpy', 'pylatex')
+
+def synthetic_catalog(num_skus : int, seed : int = 0) -> MealCatalog:
+    """
+    Creates a catalog shaped like the "Meals with SKUs" sheet with the given number of meals.
+    Parameters:
+    - num_skus (int): Number of meals.
+    - seed (int): Seed of the random generator.
+    Returns:
+    - MealCatalog: The catalog, spread evenly over the meal types.
+    """
+    rng = np.random.default_rng(seed)
+    type_names = np.array(list(TYPE_MACROS))
+    types = type_names[np.arange(num_skus) % len(type_names)]
+    ingredients = INGREDIENTS[rng.integers(0, len(INGREDIENTS), num_skus)]
+    ingredients[types == MealType.VEGAN.value] = 'Meat-Free'
+
+    macros = np.array([TYPE_MACROS[meal_type] for meal_type in type_names])[np.arange(num_skus) % len(type_names)]
+    jitter = rng.integers(-5, 6, size=num_skus)
+    macros[:, 0] += jitter
+    macros[:, 1] -= jitter
+
+    prefixes = np.array([TYPE_PREFIXES[meal_type] for meal_type in type_names])[np.arange(num_skus) % len(type_names)]
+    numbers = np.arange(num_skus).astype(str)
+    meals = pd.DataFrame({
+        'SKU': np.char.add(prefixes, np.char.zfill(numbers, 7)),
+        'Meal': np.char.add('Synthetic Meal ', numbers),
+        'Type': types,
+        'Main Ingredient': ingredients,
+        'Carbohydrate (%)': macros[:, 0],
+        'Protein (%)': macros[:, 1],
+        'Fat (%)': macros[:, 2],
+    })
+    return MealCatalog({MealCatalog.MEALS_SHEET: meals}, version=f"synthetic-{num_skus}-{seed}")
+
+def sample_customer(frequency : str, days : int) -> Customer:
+    """
+    Creates a Keto customer with a pork allergy, the most common request, starting on a fixed Monday.
+    """
+    return Customer.from_record({
+        "id": "BENCH",
+        "name": "Benchmark",
+        "age": 30,
+        "gender": "FEMALE",
+        "type": "KETO",
+        "objective": "WEIGHT_LOSS",
+        "frequency": frequency,
+        "starting_date": "2030-01-07",
+        "duration": days,
+        "allergies": ["PORK"],
+    })
+
+def plan_stages(catalog : MealCatalog, customer : Customer, output_dir : str) -> tuple:
+    """
+    Returns the stages to time, by name, and the number of meals of the plan.  Each stage is a function of no
+    arguments; the stages after 'generate' work on a plan generated beforehand.
+    """
+    meal_plan = MealPlan(customer, catalog)
+    with contextlib.redirect_stdout(io.StringIO()):
+        meal_plan.generate_meal_plan(seed=0)
+    uncalorized = meal_plan.meals_list.drop(columns=['Calories', 'Carbohydrates (g)', 'Protein (g)', 'Fat (g)'])
+    rng = np.random.default_rng(0)
+
+    def construct():
+        MealPlan(customer, catalog)
+
+    def generate():
+        with contextlib.redirect_stdout(io.StringIO()):
+            MealPlan(customer, catalog).generate_meal_plan(seed=0)
+
+    def schedule():
+        MealPlan._build_meal_schedule.cache_clear()
+        meal_plan._get_meal_schedule()
+
+    def calories():
+        meal_plan._add_calories(uncalorized, rng)
+
+    def print_plan():
+        with contextlib.redirect_stdout(io.StringIO()):
+            meal_plan.print_meal_plan()
+
+    def save_csv():
+        with contextlib.redirect_stdout(io.StringIO()):
+            meal_plan.save_meal_plan('csv', os.path.join(output_dir, 'plan.csv'))
+
+    def render():
+        DocumentGenerator.write_tex(meal_plan, io.StringIO())
+
+    stages = {
+        'construct': construct,
+        'generate': generate,
+        'schedule': schedule,
+        'calories': calories,
+        'print': print_plan,
+        'save_csv': save_csv,
+        'render': render,
+    }
+    return stages, len(meal_plan.meals_list)
+
+def measure(function, repeat : int) -> dict:
+    """
+    Times a function and measures the peak memory it allocates.
+    Returns:
+    - dict: The median seconds over `repeat` calls and the peak traced memory of one more call, in KiB.
+    """
+    function()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    # tracemalloc slows allocations down, so memory is measured apart from the timings.
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': statistics.median(timings), 'peak_kib': peak / 1024}
+
+def startup_time(repeat : int) -> dict:
+    """
+    Measures `import main` in fresh interpreters with `python -X importtime`.
+    Returns:
+    - dict: The median import time of main in seconds and the forbidden heavy modules it imported.
+    """
+    timings = []
+    for _ in range(max(1, repeat)):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], capture_output=True, text=True, check=True)
+        imported = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, module = line[len('import time:'):].split('|')
+            imported[module.strip()] = int(cumulative) / 1e6
+        timings.append(imported['main'])
+    heavy = sorted(module for module in imported if module.split('.')[0] in STARTUP_FORBIDDEN and '.' not in module)
+    return {'seconds': statistics.median(timings), 'heavy_modules': heavy}
+
+def run(sizes : list, frequencies : list, durations : list, repeat : int) -> dict:
+    """
+    Runs the suite.
+    Returns:
+    - dict: Case name ('<skus>/<frequency>/<days>d', or '<skus>/catalog' for the catalog build) to stage name
+            to measurements.
+    """
+    startup = startup_time(repeat)
+    results = {'startup': {'import_main': startup}}
+    print(f"startup  import main in {startup['seconds'] * 1000:.1f}ms" + (f", imports {', '.join(startup['heavy_modules'])}" if startup['heavy_modules'] else ""), flush=True)
+    with tempfile.TemporaryDirectory() as output_dir:
+        for size in sizes:
+            catalog_result = measure(lambda: synthetic_catalog(size), max(1, min(repeat, 3)))
+            results[f'{size}/catalog'] = {'build': catalog_result}
+            print(f"{size:>9} SKUs  catalog built in {catalog_result['seconds']:.3f}s, peak {catalog_result['peak_kib'] / 1024:.1f} MiB", flush=True)
+            catalog = synthetic_catalog(size)
+            for frequency in frequencies:
+                for days in durations:
+                    stages, num_meals = plan_stages(catalog, sample_customer(frequency, days), output_dir)
+                    case = {}
+                    for stage, function in stages.items():
+                        case[stage] = measure(function, repeat)
+                        case[stage]['meals_per_second'] = num_meals / case[stage]['seconds']
+                    results[f'{size}/{frequency}/{days}d'] = case
+                    print(f"{size:>9} SKUs  {frequency:<6}{days:>4}d  " + "  ".join(
+                        f"{stage} {m['seconds'] * 1000:.2f}ms" for stage, m in case.items()), flush=True)
+    return results
+
+def compare(results : dict, baseline : dict, tolerance : float) -> list:
+    """
+    Compares results with a baseline.
+    Returns:
+    - list: (case, stage, baseline seconds, seconds) of every stage slower than the baseline by more than the tolerance.
+    """
+    regressions = []
+    for case, stages in results.items():
+        for stage, measurements in stages.items():
+            reference = baseline.get(case, {}).get(stage)
+            if reference is None:
+                continue
+            seconds, reference_seconds = measurements['seconds'], reference['seconds']
+            if seconds > reference_seconds * (1 + tolerance) and seconds - reference_seconds > NOISE_FLOOR:
+                regressions.append((case, stage, reference_seconds, seconds))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark suite of the meal plan pipeline on synthetic catalogs.")
+    parser.add_argument('--sizes', default='100,10000,1000000', help="Comma-separated catalog sizes in SKUs (default: 100,10000,1000000)")
+    parser.add_argument('--frequencies', default=','.join(MealFrequency.__members__), help="Comma-separated MealFrequency names (default: all)")
+    parser.add_argument('--durations', default='7,28,90', help="Comma-separated plan durations in days (default: 7,28,90)")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed calls per stage; the median is reported (default: 5)")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help=f"Baseline file (default: {BASELINE_PATH})")
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Slowdown over the baseline that is flagged (default: 0.25)")
+    parser.add_argument('--output', default=None, help="Also write the results to this JSON file")
+    parser.add_argument('--startup-budget', type=float, default=STARTUP_BUDGET, help=f"Seconds `import main` may take (default: {STARTUP_BUDGET})")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    frequencies = args.frequencies.split(',')
+    durations = [int(days) for days in args.durations.split(',')]
+    results = run(sizes, frequencies, durations, args.repeat)
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+
+    startup = results['startup']['import_main']
+    startup_ok = startup['seconds'] <= args.startup_budget and not startup['heavy_modules']
+    if not startup_ok:
+        print(f"Startup over budget: import main took {startup['seconds'] * 1000:.1f}ms (budget {args.startup_budget * 1000:.0f}ms)"
+              + (f" and imported {', '.join(startup['heavy_modules'])}" if startup['heavy_modules'] else ""))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}.  Store one with --save-baseline.")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if not regressions:
+            print(f"No stage is more than {args.tolerance:.0%} slower than the baseline.")
+        else:
+            print(f"{len(regressions)} regressions over {args.tolerance:.0%}:")
+        for case, stage, reference_seconds, seconds in regressions:
+            print(f"  {case:<24}{stage:<12}{reference_seconds * 1000:>10.2f}ms -> {seconds * 1000:>10.2f}ms ({seconds / reference_seconds - 1:+.0%})")
+
+    if regressions or not startup_ok:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,594 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+import pandas as pd
+
+from config import MealType, Allergen, bcolors
+from metrics import Metrics
+
+class MealCatalog:
+    """
+    The meal catalog read from the meal dataset workbook.
+
+    Parsing the workbook through openpyxl is slow, so the first load compiles every sheet into plain
+    NumPy arrays (one .npy file per column) next to a manifest holding the workbook's size, mtime and
+    SHA-256.  Later loads memory-map the compiled arrays and only rebuild them once the workbook changes.  Files are
+    renamed into place once fully written and the manifest is written last, under a lock so that processes loading
+    a cold cache at once compile it only once.  A cache with missing or damaged columns is compiled again.
+
+    A single catalog is shared by every MealPlan in the process through MealCatalog.get().  Its DataFrames
+    must be treated as read-only.
+
+    Candidate pools are answered from per-type position arrays and a per-meal allergen bitmask, so
+    filtering never scans the string columns more than once.  Each pool also gets a MacroIndex on first use, to
+    find the meals with the closest macro split.
+
+    The meals are held compactly: 'Type' and 'Main Ingredient' as categorical codes and the macro split as one
+    packed float32 matrix.  Plans refer to meals by their int32 position in `meals` instead of copying the rows.
+    """
+    SOURCE_PATH = "datasets/meal_dataset.xlsx"
+    CACHE_DIR = "datasets/.cache"
+    MEALS_SHEET = "Meals with SKUs"
+    CRITERIA_SHEET = "Meal Criteria"
+    CALORIES_SHEET = "Meals vs Calories"
+    SHEETS = (MEALS_SHEET, CRITERIA_SHEET, CALORIES_SHEET)
+    CACHE_FORMAT = 1
+    MACRO_COLUMNS = ('Carbohydrate (%)', 'Protein (%)', 'Fat (%)')
+    # Columns with few distinct values, stored as categorical codes.
+    CATEGORICAL_COLUMNS = ('Type', 'Main Ingredient')
+    # Allergens that exclude more than the ingredient of the same name.
+    ALLERGEN_INGREDIENTS = {
+        Allergen.MEAT.name: ('Chicken', 'Beef', 'Pork'),
+    }
+
+    meals : pd.DataFrame
+    criteria : pd.DataFrame
+    calories : pd.DataFrame
+    macros : np.ndarray
+    version : str
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, sheets : dict, version : str) -> None:
+        """
+        Initializes the catalog from already loaded sheets.
+        Parameters:
+        - sheets (dict): Sheet name to DataFrame.  Must contain the "Meals with SKUs" sheet.
+        - version (str): Identifier of the workbook contents the sheets were read from.
+        Returns:
+        - None
+        """
+        assert self.MEALS_SHEET in sheets, f"Missing sheet {self.MEALS_SHEET}"
+        self.sheets = dict(sheets)
+        self.meals = self._compact(sheets[self.MEALS_SHEET])
+        self.sheets[self.MEALS_SHEET] = self.meals
+        self.criteria = sheets.get(self.CRITERIA_SHEET, pd.DataFrame())
+        self.calories = sheets.get(self.CALORIES_SHEET, pd.DataFrame())
+        self.version = version
+        assert type(self.meals) == pd.DataFrame, f"Expected DataFrame, got {type(self.meals)}"
+        assert len(self.meals) > 0, "Raw dataset is empty"
+        self._build_indexes()
+
+    def candidates(self, meal_type : str, allergies=()) -> np.ndarray:
+        """
+        Returns the positions of the meals of the given type that contain none of the given allergens.
+        Parameters:
+        - meal_type (str): Name of the MealType, e.g. 'KETO'.
+        - allergies (iterable): Names of the Allergens to exclude, e.g. ('PORK', 'SEAFOOD').
+        Returns:
+        - np.ndarray: Read-only array of row positions into `meals`, in catalog order.
+        """
+        key = (meal_type, frozenset(allergies))
+        positions = self._candidate_cache.get(key)
+        if positions is None:
+            with Metrics.stage('filter'):
+                positions = self._type_positions[meal_type]
+                mask = self.allergen_mask(key[1])
+                if mask:
+                    positions = positions[(self._allergen_bits[positions] & mask) == 0]
+                positions.flags.writeable = False
+                self._candidate_cache[key] = positions
+        else:
+            Metrics.count('candidate_cache_hits')
+        return positions
+
+    def macro_index(self, meal_type : str, allergies=()) -> "MacroIndex":
+        """
+        Returns the index of the macro splits of the meals of the given type that contain none of the given allergens.
+        Parameters:
+        - meal_type (str): Name of the MealType, e.g. 'KETO'.
+        - allergies (iterable): Names of the Allergens to exclude, e.g. ('PORK', 'SEAFOOD').
+        Returns:
+        - MacroIndex: The index, built on first use and shared afterwards.
+        """
+        key = (meal_type, frozenset(allergies))
+        index = self._macro_index_cache.get(key)
+        if index is None:
+            with Metrics.stage('macro_index'):
+                positions = self.candidates(meal_type, key[1])
+                index = MacroIndex(positions, self.macros[positions])
+                self._macro_index_cache[key] = index
+        return index
+
+    def allergen_mask(self, allergies) -> int:
+        """
+        Returns the allergen bitmask matching the given allergen names.
+        """
+        mask = 0
+        for allergy in allergies:
+            mask |= 1 << self._allergen_bit[allergy]
+        return mask
+
+    def contains_allergens(self, positions : np.ndarray, allergies) -> np.ndarray:
+        """
+        Tells which of the given meals contain any of the given allergens.
+        Parameters:
+        - positions (np.ndarray): Row positions into `meals`.
+        - allergies (iterable): Names of the Allergens, e.g. ('PORK', 'SEAFOOD').
+        Returns:
+        - np.ndarray: A boolean per position.
+        """
+        return (self._allergen_bits[positions] & self.allergen_mask(allergies)) != 0
+
+    def _build_indexes(self) -> None:
+        """
+        Precomputes the row positions of every meal type, the allergen bitmask of every meal and the macro matrix.
+        """
+        self.macros = self.meals[list(self.MACRO_COLUMNS)].to_numpy(dtype=np.float32)
+        self.macros.flags.writeable = False
+
+        # Compare the categorical codes, not the strings.
+        types = self.meals['Type'].cat
+        ingredients = self.meals['Main Ingredient'].cat
+
+        self._type_positions = {}
+        for meal_type in MealType:
+            code = types.categories.get_indexer([meal_type.value])[0]
+            positions = np.flatnonzero(types.codes.to_numpy() == code) if code >= 0 else np.array([], dtype=np.int64)
+            positions.flags.writeable = False
+            self._type_positions[meal_type.name] = positions
+
+        self._allergen_bit = {}
+        self._allergen_bits = np.zeros(len(self.meals), dtype=np.uint32)
+        for bit, allergen in enumerate(Allergen):
+            self._allergen_bit[allergen.name] = bit
+            excluded = ingredients.categories.get_indexer(self.ALLERGEN_INGREDIENTS.get(allergen.name, (allergen.value,)))
+            self._allergen_bits[np.isin(ingredients.codes.to_numpy(), excluded[excluded >= 0])] |= np.uint32(1 << bit)
+        self._candidate_cache = {}
+        self._macro_index_cache = {}
+
+    @classmethod
+    def _compact(cls, meals : pd.DataFrame) -> pd.DataFrame:
+        """
+        Returns the meals with the categorical columns stored as categorical codes.
+        """
+        columns = {column: 'category' for column in cls.CATEGORICAL_COLUMNS if column in meals and not isinstance(meals[column].dtype, pd.CategoricalDtype)}
+        return meals.astype(columns) if columns else meals
+
+    @classmethod
+    def get(cls) -> "MealCatalog":
+        """
+        Returns the process-wide catalog, loading it on first use.
+        Returns:
+        - MealCatalog: The shared catalog.
+        """
+        catalog = cls._instance
+        if catalog is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    with Metrics.stage('catalog_load'):
+                        cls._instance = cls.load()
+                catalog = cls._instance
+        return catalog
+
+    @classmethod
+    def reload(cls) -> "MealCatalog":
+        """
+        Reloads the process-wide catalog from the workbook.  Plans that already hold the previous catalog keep using it.
+        Returns:
+        - MealCatalog: The newly loaded catalog.
+        """
+        with Metrics.stage('catalog_load'):
+            catalog = cls.load()
+        with cls._instance_lock:
+            cls._instance = catalog
+        return catalog
+
+    @classmethod
+    def set_instance(cls, catalog) -> None:
+        """
+        Replaces the process-wide catalog, e.g. to inject a small in-memory catalog in tests.
+        Parameters:
+        - catalog (MealCatalog): The catalog to share, or None to load it from the workbook again on next use.
+        Example:
+            >>> MealCatalog.set_instance(MealCatalog({MealCatalog.MEALS_SHEET: meals_df}, version="test"))
+        """
+        assert catalog is None or isinstance(catalog, MealCatalog), f"Expected MealCatalog, got {type(catalog)}"
+        with cls._instance_lock:
+            cls._instance = catalog
+
+    @classmethod
+    def load(cls, source_path : str = SOURCE_PATH, cache_dir : str = CACHE_DIR) -> "MealCatalog":
+        """
+        Loads the catalog from the compiled cache, compiling the workbook first if the cache is missing or stale.
+        Parameters:
+        - source_path (str): Path to the meal dataset workbook.
+        - cache_dir (str): Directory holding the compiled arrays.  The cache is skipped entirely if None.
+        Returns:
+        - MealCatalog: The loaded catalog.
+        """
+        if cache_dir is None:
+            sheets = pd.read_excel(source_path, sheet_name=list(cls.SHEETS))
+            return cls(sheets, cls._hash_file(source_path))
+
+        cache_path = os.path.join(cache_dir, os.path.splitext(os.path.basename(source_path))[0])
+        stat = os.stat(source_path)
+        manifest = cls._read_manifest(cache_path)
+
+        if manifest is not None and (manifest['mtime_ns'], manifest['size']) != (stat.st_mtime_ns, stat.st_size):
+            # The file was touched; only rebuild when its contents actually changed.
+            if manifest['sha256'] == cls._hash_file(source_path):
+                manifest.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                cls._write_manifest(cache_path, manifest)
+            else:
+                manifest = None
+
+        if manifest is not None:
+            sheets = cls._read_sheets(cache_path, manifest)
+            if sheets is not None:
+                Metrics.count('catalog_cache_hits')
+                return cls(sheets, manifest['sha256'])
+        damaged = manifest
+
+        with cls._compile_lock(cache_path):
+            # Another process may have compiled the workbook while this one waited for the lock.
+            manifest = cls._read_manifest(cache_path)
+            sheets = None
+            if manifest is not None and manifest != damaged and (manifest['mtime_ns'], manifest['size']) == (stat.st_mtime_ns, stat.st_size):
+                sheets = cls._read_sheets(cache_path, manifest)
+            if sheets is None:
+                with Metrics.stage('catalog_compile'):
+                    manifest = cls.compile(source_path, cache_path)
+                sheets = cls._read_sheets(cache_path, manifest)
+                assert sheets is not None, f"Could not read the catalog compiled in {cache_path}"
+        return cls(sheets, manifest['sha256'])
+
+    @classmethod
+    def compile(cls, source_path : str, cache_path : str) -> dict:
+        """
+        Compiles every catalog sheet of the workbook into .npy column files and writes the manifest.  Every file is
+        written to a temporary file and renamed into place, and the manifest last, so a reader never sees a partly
+        written file.  Callers running in parallel must hold the compile lock (see load).
+        Parameters:
+        - source_path (str): Path to the meal dataset workbook.
+        - cache_path (str): Directory to write the compiled columns to.
+        Returns:
+        - dict: The written manifest.
+        """
+        os.makedirs(cache_path, exist_ok=True)
+        stat = os.stat(source_path)
+        sha256 = cls._hash_file(source_path)
+        sheets = pd.read_excel(source_path, sheet_name=list(cls.SHEETS))
+
+        manifest = {
+            'format': cls.CACHE_FORMAT,
+            'source': os.path.abspath(source_path),
+            'sha256': sha256,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sheets': {},
+        }
+        for sheet_index, (name, df) in enumerate(sheets.items()):
+            columns = []
+            for column_index, column in enumerate(df.columns):
+                prefix = f"{sha256[:16]}-{sheet_index}-{column_index}"
+                values = df[column]
+                entry = {'name': column, 'values': f"{prefix}.npy", 'nulls': None}
+                if pd.api.types.is_numeric_dtype(values):
+                    data = values.to_numpy()
+                else:
+                    nulls = values.isna().to_numpy()
+                    data = values.fillna('').astype(str).to_numpy().astype(str)
+                    if nulls.any():
+                        entry['nulls'] = f"{prefix}-nulls.npy"
+                        cls._save_column(os.path.join(cache_path, entry['nulls']), nulls)
+                cls._save_column(os.path.join(cache_path, entry['values']), data)
+                columns.append(entry)
+            manifest['sheets'][name] = {'rows': len(df), 'columns': columns}
+
+        # The manifest is replaced last so a reader never sees it point at half-written columns.
+        cls._write_manifest(cache_path, manifest)
+        cls._remove_stale_columns(cache_path, sha256[:16])
+        return manifest
+
+    @classmethod
+    def _read_sheets(cls, cache_path : str, manifest : dict):
+        """
+        Reads every sheet of a manifest from the compiled columns.
+        Returns:
+        - dict: Sheet name to DataFrame, or None if a column file is missing or damaged, so the cache is compiled again.
+        """
+        try:
+            return {name: cls._read_sheet(cache_path, sheet) for name, sheet in manifest['sheets'].items()}
+        except (OSError, ValueError, EOFError, AssertionError) as e:
+            print(f"{bcolors.WARNING}WARNING: The compiled meal catalog in {cache_path} is damaged, compiling it again: {type(e).__name__}: {e}{bcolors.ENDC}")
+            return None
+
+    @staticmethod
+    def _read_sheet(cache_path : str, sheet : dict) -> pd.DataFrame:
+        """
+        Reassembles a sheet from its memory-mapped column files.
+        Parameters:
+        - cache_path (str): Directory holding the compiled columns.
+        - sheet (dict): The sheet's manifest entry.
+        Returns:
+        - pd.DataFrame: The sheet.
+        """
+        data = {}
+        for column in sheet['columns']:
+            values = np.load(os.path.join(cache_path, column['values']), mmap_mode='r')
+            if values.dtype.kind == 'U':
+                values = values.astype(object)
+                if column['nulls'] is not None:
+                    values[np.load(os.path.join(cache_path, column['nulls']))] = np.nan
+            data[column['name']] = values
+        df = pd.DataFrame(data)
+        assert len(df) == sheet['rows'], f"Expected {sheet['rows']} rows, got {len(df)}"
+        return df
+
+    @staticmethod
+    def _read_manifest(cache_path : str):
+        """
+        Reads the cache manifest.
+        Returns:
+        - dict: The manifest, or None if it is missing, unreadable or of another cache format.
+        """
+        try:
+            with open(os.path.join(cache_path, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('format') != MealCatalog.CACHE_FORMAT:
+            return None
+        return manifest
+
+    @staticmethod
+    def _write_manifest(cache_path : str, manifest : dict) -> None:
+        """
+        Atomically replaces the cache manifest.
+        """
+        tmp_path = os.path.join(cache_path, f'manifest.json.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(cache_path, 'manifest.json'))
+
+    @staticmethod
+    def _save_column(path : str, values : np.ndarray) -> None:
+        """
+        Atomically writes a column file.
+        """
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, values)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _compile_lock(cache_path : str):
+        """
+        Holds an exclusive lock on the cache directory, so that a single process compiles the workbook at a time.
+        The lock is released by the operating system if the process dies.
+        """
+        os.makedirs(cache_path, exist_ok=True)
+        with open(os.path.join(cache_path, 'compile.lock'), 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @staticmethod
+    def _remove_stale_columns(cache_path : str, prefix : str) -> None:
+        """
+        Deletes column files compiled from previous versions of the workbook.
+        """
+        for filename in os.listdir(cache_path):
+            # Temporary files are left behind by compilers that died while writing.
+            if (filename.endswith('.npy') and not filename.startswith(prefix)) or filename.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(cache_path, filename))
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _hash_file(path : str) -> str:
+        """
+        Returns the SHA-256 hex digest of the file at the given path.
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+class MacroIndex:
+    """
+    Nearest-neighbour index over the macro splits of a pool of meals, to find the meals closest to a given split.
+
+    The meals are sorted by their carbohydrate share.  A query starts at the query's carbohydrate share and widens a
+    window over the sorted meals, doubling it, until no meal outside the window can be closer than the k-th closest
+    meal inside it: a meal whose carbohydrate share differs by d is at least d away.  Meals at the same distance
+    come in catalog order.
+    """
+    positions : np.ndarray
+    macros : np.ndarray
+
+    def __init__(self, positions : np.ndarray, macros : np.ndarray) -> None:
+        """
+        Builds the index.
+        Parameters:
+        - positions (np.ndarray): Catalog positions of the meals.
+        - macros (np.ndarray): Macro split of every meal, one row per position, carbohydrate share first.
+        """
+        assert len(positions) == len(macros), "Expected one macro split per meal"
+        order = np.lexsort((positions, macros[:, 0]))
+        self.positions = np.asarray(positions)[order]
+        self.macros = np.asarray(macros, dtype=np.float64)[order]
+        self._keys = self.macros[:, 0].copy()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def query(self, point, k : int = 5, exclude=()):
+        """
+        Returns the k meals with the macro split closest to a point, by Euclidean distance in percentage points.
+        Parameters:
+        - point (array-like): The carbohydrate, protein and fat shares to search around.
+        - k (int): Number of meals to return.
+        - exclude (iterable): Catalog positions of meals to leave out.
+        Returns:
+        - tuple: The catalog positions of the closest meals, closest first, and their distances.  Fewer than k if
+                 the pool is smaller.
+        """
+        assert k >= 1, "k must be at least 1"
+        point = np.asarray(point, dtype=np.float64)
+        exclude = np.fromiter(exclude, dtype=np.int64)
+        size = len(self.positions)
+        lo = hi = int(np.searchsorted(self._keys, point[0]))
+        width = max(4 * (k + len(exclude)), 16)
+        found, distances = [], []
+        while lo > 0 or hi < size:
+            new_lo, new_hi = max(0, lo - width), min(size, hi + width)
+            window = np.r_[new_lo:lo, hi:new_hi]
+            lo, hi = new_lo, new_hi
+            window = window[~np.isin(self.positions[window], exclude)]
+            found.append(window)
+            distances.append(((self.macros[window] - point) ** 2).sum(axis=1))
+            count = sum(len(d) for d in distances)
+            if count >= k:
+                kth = np.partition(np.concatenate(distances), k - 1)[k - 1]
+                gap = min(point[0] - self._keys[lo - 1] if lo > 0 else np.inf, self._keys[hi] - point[0] if hi < size else np.inf)
+                if gap * gap >= kth:
+                    break
+            width *= 2
+        if not found:
+            return self.positions[:0], np.zeros(0)
+        found, distances = np.concatenate(found), np.concatenate(distances)
+        positions = self.positions[found]
+        closest = np.lexsort((positions, distances))[:k]
+        return positions[closest], np.sqrt(distances[closest])
+
+class CatalogWatcher:
+    """
+    Keeps the process-wide catalog up to date with the workbook, for long-running processes such as the service.
+
+    A daemon thread polls the workbook's mtime and size.  Once a change has settled for one poll, so that a
+    workbook still being written is not read, the new catalog is compiled and indexed in the watcher's thread and
+    swapped in with MealCatalog.set_instance.  The swap replaces a single reference: plans and requests that already
+    hold the previous catalog finish with it, and the next ones get the new one.  If the new workbook cannot be read,
+    the previous catalog stays in use.
+    """
+    source_path : str
+    interval : float
+
+    def __init__(self, source_path : str = MealCatalog.SOURCE_PATH, interval : float = 5.0, on_reload=None) -> None:
+        """
+        Initializes the watcher.
+        Parameters:
+        - source_path (str): Path to the meal dataset workbook, which the process-wide catalog is loaded from.
+        - interval (float): Seconds between two polls.
+        - on_reload (callable): Called with the new catalog after every swap.
+        """
+        assert interval > 0, "Interval must be positive"
+        self.source_path = source_path
+        self.interval = interval
+        self.on_reload = on_reload
+        self._stat = self._file_stat()
+        self._changed = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "CatalogWatcher":
+        """
+        Starts polling in a daemon thread.
+        Returns:
+        - CatalogWatcher: The watcher, for chaining.
+        """
+        self._thread = threading.Thread(target=self._run, name='catalog-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stops polling.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def check(self) -> bool:
+        """
+        Polls the workbook once, and reloads the catalog if a change seen by the previous poll has settled.
+        Returns:
+        - bool: True if a new catalog was swapped in.
+        """
+        stat = self._file_stat()
+        if stat == self._stat:
+            self._changed = None
+            return False
+        if stat != self._changed:
+            self._changed = stat
+            return False
+
+        self._stat, self._changed = stat, None
+        try:
+            with Metrics.stage('catalog_load'):
+                catalog = MealCatalog.load(self.source_path)
+        except Exception as e:
+            print(f"{bcolors.WARNING}WARNING: Could not reload the meal catalog from {self.source_path}, keeping the previous one: {type(e).__name__}: {e}{bcolors.ENDC}")
+            return False
+        if catalog.version == MealCatalog.get().version:
+            return False
+        MealCatalog.set_instance(catalog)
+        Metrics.count('catalog_reloads')
+        if self.on_reload is not None:
+            self.on_reload(catalog)
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def _file_stat(self):
+        """
+        Returns the workbook's mtime and size, or None if it is missing.
+        """
+        try:
+            stat = os.stat(self.source_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
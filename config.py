@@ -37,6 +37,53 @@ class Allergen(BaseEnum):
     SEAFOOD = "Seafood"
     MEAT = "Meat"
     
+# Times of the day each meal is served, by MealFrequency.
+MEAL_TIMES = {
+    'OMAD': ("17:00",),
+    'TMAD': ("11:00", "18:00"),
+    'THMAD': ("08:00", "12:00", "19:00"),
+}
+
+# Calories per meal by (MealObjective, MealFrequency) as [minimum, maximum), following the "Meals vs Calories" guideline.
+CALORIES_PER_MEAL = {
+    ('WEIGHT_LOSS', 'OMAD'): (1200, 1800),
+    ('WEIGHT_LOSS', 'TMAD'): (600, 900),
+    ('WEIGHT_LOSS', 'THMAD'): (400, 600),
+    ('MUSCLE_GAIN', 'OMAD'): (2500, 3500),
+    ('MUSCLE_GAIN', 'TMAD'): (1250, 1750),
+    ('MUSCLE_GAIN', 'THMAD'): (833, 1167),
+    ('MAINTAIN', 'OMAD'): (1800, 2400),
+    ('MAINTAIN', 'TMAD'): (900, 1200),
+    ('MAINTAIN', 'THMAD'): (600, 800),
+}
+
+# Target share of the day's calories from carbohydrates, protein and fat (%), by MealObjective.
+MACRO_TARGETS = {
+    'WEIGHT_LOSS': (25, 40, 35),
+    'MUSCLE_GAIN': (40, 35, 25),
+    'MAINTAIN': (45, 25, 30),
+}
+
+# Youngest age accepted for a subscription.
+MINIMUM_AGE = 18
+
+# Longest subscription accepted, in days.
+MAX_SUBSCRIPTION_DAYS = 366
+
+# Minimum number of meal slots between two servings of the same meal.
+REPEAT_WINDOW = 10
+
+# Grams of a macronutrient per calorie of the meal at 100% of that macronutrient.
+GRAMS_PER_CALORIE = 0.129598
+
+# Price of a meal (Php) by MealType, unless the price table sets another price.
+PRICE_PER_MEAL = {
+    'KETO': 1000,
+    'ORGANIC': 800,
+    'NON_ORGANIC': 600,
+    'VEGAN': 500,
+}
+    
 class bcolors:
     HEADER = '\033[95m'
     OKBLUE = '\033[94m'
@@ -1,4 +1,5 @@
-from config import MealFrequency, MealObjective, MealType, Allergen, Gender, bcolors
+import re
+from config import MealFrequency, MealObjective, MealType, Allergen, Gender, bcolors, MINIMUM_AGE, MAX_SUBSCRIPTION_DAYS
 from datetime import date, timedelta, datetime
 from questionnaire_utils import QuestionnaireUtils
 
@@ -10,6 +11,7 @@ class Customer:
     objective : MealObjective
     frequency : MealFrequency
     allergies : list[Allergen]
+    customer_id : str = None
     
     def __init__(self, profile : dict) -> None:
         """
@@ -31,6 +33,81 @@ class Customer:
         
         assert profile['gender'] in list(Gender.__members__)
         self.profile = profile
+    
+    @classmethod
+    def from_record(cls, record : dict) -> "Customer":
+        """
+        Creates a customer whose preferences are already answered, e.g. from a row of a batch input file.
+        Parameters:
+        - record (dict): A dictionary with the keys 'name', 'age', 'gender', 'type', 'objective', 'frequency', 'starting_date'
+                         and either 'duration' (in days) or 'ending_date'.  The keys 'id' and 'allergies' are optional.
+                         Choices may be given by name ('KETO') or by value ('Keto'), dates as ISO strings and allergies
+                         as a list or a comma-separated string.
+        Raises:
+        - AssertionError: If a required key is missing or a value is invalid, the customer is younger than
+                          MINIMUM_AGE or the subscription lasts more than MAX_SUBSCRIPTION_DAYS.
+        Returns:
+        - Customer: The customer with all preferences set.
+        """
+        required = ['name', 'age', 'gender', 'type', 'objective', 'frequency', 'starting_date']
+        missing = [key for key in required if record.get(key) in (None, '')]
+        assert not missing, f"Missing fields {missing}"
+        assert record.get('duration') not in (None, '') or record.get('ending_date') not in (None, ''), "Either duration or ending_date is required"
+        
+        customer = cls({
+            "name": str(record['name']),
+            "age": int(record['age']),
+            "gender": cls._to_choice(Gender, record['gender']),
+        })
+        assert customer.profile['age'] >= MINIMUM_AGE, f"Customers must be {MINIMUM_AGE} years or older"
+        customer.customer_id = str(record.get('id') or record['name'])
+        customer.type = cls._to_choice(MealType, record['type'])
+        customer.objective = cls._to_choice(MealObjective, record['objective'])
+        customer.frequency = cls._to_choice(MealFrequency, record['frequency'])
+        
+        customer.starting_date = cls._to_datetime(record['starting_date'])
+        if record.get('ending_date') not in (None, ''):
+            customer.ending_date = cls._to_datetime(record['ending_date'])
+        else:
+            duration = int(record['duration'])
+            assert 0 < duration <= MAX_SUBSCRIPTION_DAYS, f"Duration must be between 1 and {MAX_SUBSCRIPTION_DAYS} days"
+            customer.ending_date = customer.starting_date + timedelta(days=duration)
+        assert customer.ending_date > customer.starting_date, "Ending date must be after starting date"
+        assert customer.ending_date - customer.starting_date <= timedelta(days=MAX_SUBSCRIPTION_DAYS), f"Subscriptions can last at most {MAX_SUBSCRIPTION_DAYS} days"
+        
+        allergies = record.get('allergies') or ()
+        if isinstance(allergies, str):
+            allergies = [allergy.strip() for allergy in allergies.split(',') if allergy.strip()]
+        customer.allergies = tuple(cls._to_choice(Allergen, allergy) for allergy in allergies)
+        return customer
+    
+    @staticmethod
+    def _to_choice(enum, value : str) -> str:
+        """
+        Returns the enum member name for the given member name or value.
+        """
+        if value in enum.__members__:
+            return value
+        assert value in enum.to_dict(), f"Invalid {enum.__name__} {value}"
+        return enum.to_dict()[value]
+    
+    @staticmethod
+    def _to_datetime(value) -> datetime:
+        """
+        Returns the given date or ISO date string as a datetime.
+        """
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day)
+        return datetime.fromisoformat(str(value))
+
+    def file_stem(self) -> str:
+        """
+        Returns a file name, without extension, for the customer's outputs.  Customers are told apart by their id,
+        or by their name if they have none.
+        """
+        return re.sub(r'[^\w.-]', '_', self.customer_id or self.profile['name'])
         
     def ask_duration(self):
         """
@@ -109,10 +186,14 @@ class Customer:
         self.ask_allergies()
         self.ask_add_ons()
         
-    def confirm_preferences(self):
+    def confirm_preferences(self, on_change=None):
         """
         Displays the current preferences of the customer and allows them to modify their preferences if desired.
 
+        Parameters:
+        - on_change (callable): Called with no arguments after every modified preference, e.g. to update and show
+                                a meal plan already generated for the customer.
+
         Returns:
             None
         """
@@ -131,6 +212,8 @@ class Customer:
             while confirmation == "Yes":
                 choice = QuestionnaireUtils.ask_multiple_choice_question(question, options)
                 choice()
+                if on_change is not None:
+                    on_change()
                 self.print_preferences()
                 confirmation = QuestionnaireUtils.ask_multiple_choice_question("Would you like to modify another preference?", {"Yes": "Yes", "No": "No"})
         
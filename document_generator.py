@@ -1,7 +1,73 @@
+import numpy as np
+from datetime import date
 from pylatex import Document, Section, Subsection, Command, Package, Table, Tabular
-from pylatex.utils import NoEscape, italic, bold
+from pylatex.utils import NoEscape, italic, bold, escape_latex
 from pylatex.basic import NewLine
 from config import MealType, MealObjective, MealFrequency
+from metrics import Metrics
+
+# Templates of the LaTeX source produced by generate_document_from_meal_plan, used to stream it without building pylatex objects.
+_PREAMBLE_TEMPLATE = (
+    "\\documentclass{{article}}%\n"
+    "\\usepackage[T1]{{fontenc}}%\n"
+    "\\usepackage[utf8]{{inputenc}}%\n"
+    "\\usepackage{{lmodern}}%\n"
+    "\\usepackage{{textcomp}}%\n"
+    "\\usepackage{{lastpage}}%\n"
+    "\\usepackage{{graphicx}}%\n"
+    "\\usepackage{{float}}%\n"
+    "\\usepackage{{paracol}}%\n"
+    "%\n"
+    "\\title{{Meal Plan}}%\n"
+    "\\author{{{author}}}%\n"
+    "\\date{{{today}}}%\n"
+    "\\setlength{{\\columnseprule}}{{0.1pt}}%\n"
+    "%\n"
+    "\\begin{{document}}%\n"
+    "\\normalsize%\n"
+    "\\maketitle%\n"
+    "\n"
+    "\n"
+    "\\begin{{table}}[H]%\n"
+    "\\begin{{tabular}}{{rl}}%\n"
+    "Meal Type:&{meal_type}\\\\%\n"
+    "Objective:&{objective}\\\\%\n"
+    "Frequency:&{frequency}\\\\%\n"
+    "Date Covered:&{date_covered}\\\\%\n"
+    "Total Costs:&{total_cost}\\\\%\n"
+    "\\end{{tabular}}%\n"
+    "\\end{{table}}\n"
+    "\n"
+    "%\n"
+)
+_DAY_START_TEMPLATE = (
+    "\\section*{{{date}}}%\n"
+    "\\label{{sec:{label}}}%\n"
+    "\\begin{{paracol}}[{columns}]{{{columns}}}%\n"
+    "\\sloppy%\n"
+)
+_MEAL_TEMPLATE = (
+    "\\subsection*{{{meal}}}%\n"
+    "\\label{{subsec:{label}}}%\n"
+    "\\textit{{{ingredient}}}%\n"
+    "\\newline%\n"
+    "\\newline%\n"
+    "\\textbf{{{calories}}} calories%\n"
+    "\\newline%\n"
+    "\\textbf{{{carbohydrates}}}g of carbs%\n"
+    "\\newline%\n"
+    "\\textbf{{{protein}}}g of protein%\n"
+    "\\newline%\n"
+    "\\textbf{{{fat}}}g of fats%\n"
+    "\\newline%\n"
+    "\\switchcolumn\n"
+    "\n"
+    "%\n"
+)
+_DAY_END = "\\end{paracol}\n\n%\n"
+_DOCUMENT_END = "\\end{document}"
+# Characters pylatex drops from section labels.
+_LABEL_DELETIONS = dict.fromkeys(map(ord, "&%$#_{}~^\\\n\xa0[]\":;' "))
 
 class DocumentGenerator:
     @classmethod
@@ -23,7 +89,7 @@ class DocumentGenerator:
         
         doc.preamble.append(Command('title', 'Meal Plan'))
         doc.preamble.append(Command('author', meal_plan.customer.profile['name']))
-        doc.preamble.append(Command('date', NoEscape(r'\today')))
+        doc.preamble.append(Command('date', date.today().strftime('%B %-d, %Y')))
         doc.preamble.append( NoEscape(r'\setlength{\columnseprule}{0.1pt}'))
         doc.append(NoEscape(r'\maketitle'))
         
@@ -63,11 +129,11 @@ class DocumentGenerator:
         """
         meals  = meal_plan.meals_list
         
-        for date, meals in meals.groupby(meals['Date'].dt.date):
-            with doc.create(Section(NoEscape(date.strftime('%B %-d, %Y')), numbering=False)):
-                doc.append(NoEscape(rf'\begin{{paracol}}[{len(meals)}]{{{len(meals)}}}'))
+        for day, day_meals in meals.groupby(meals['Date'].dt.date):
+            with doc.create(Section(NoEscape(day.strftime('%B %-d, %Y')), numbering=False)):
+                doc.append(NoEscape(rf'\begin{{paracol}}[{len(day_meals)}]{{{len(day_meals)}}}'))
                 doc.append(NoEscape(r"\sloppy"))
-                for index, row in meals.iterrows():
+                for index, row in day_meals.iterrows():
                     
                     with doc.create(Subsection(row['Meal'], numbering=False)):
                         doc.append(italic(row['Main Ingredient']))
@@ -84,4 +150,94 @@ class DocumentGenerator:
                         doc.append(NoEscape(r'\switchcolumn'))
              
                 doc.append(NoEscape(r'\end{paracol}'))
-            
\ No newline at end of file
+            
+    @classmethod
+    def write_tex(cls, meal_plan, file) -> None:
+        """
+        Streams the LaTeX source of the meal plan's document to a file, without building pylatex objects.
+        The source is byte-identical to generate_document_from_meal_plan(meal_plan).dumps().
+        Parameters:
+        - meal_plan: The meal plan object to write the document of.
+        - file: A text file object opened for writing.
+        Returns:
+        None
+        """
+        with Metrics.stage('render'):
+            cls._write_tex(meal_plan, file)
+
+    @classmethod
+    def _write_tex(cls, meal_plan, file) -> None:
+        """
+        Writes the LaTeX source; see write_tex.
+        """
+        customer = meal_plan.customer
+        date_covered = f'{customer.starting_date.strftime('%B %-d, %Y')} - {customer.ending_date.strftime('%B %-d, %Y')}'
+        file.write(_PREAMBLE_TEMPLATE.format(
+            author=escape_latex(customer.profile['name']),
+            today=escape_latex(date.today().strftime('%B %-d, %Y')),
+            meal_type=escape_latex(MealType[customer.type].value),
+            objective=escape_latex(MealObjective[customer.objective].value),
+            frequency=escape_latex(MealFrequency[customer.frequency].value),
+            date_covered=escape_latex(date_covered),
+            total_cost=escape_latex(f'Php {meal_plan.total_cost:.2f}'),
+        ))
+
+        meals = meal_plan.meals_list
+        # A stable sort by day keeps the meals of each day in plan order, like groupby.
+        days = meals['Date'].to_numpy().astype('datetime64[D]')
+        order = np.argsort(days, kind='stable')
+        days = days[order]
+        blocks = [
+            _MEAL_TEMPLATE.format(meal=meal, label=label, ingredient=ingredient, calories=calories, carbohydrates=carbohydrates, protein=protein, fat=fat)
+            for meal, label, ingredient, calories, carbohydrates, protein, fat in zip(
+                cls._escape_column(meals['Meal'].to_numpy()[order]),
+                cls._label_column(meals['Meal'].to_numpy()[order]),
+                cls._escape_column(meals['Main Ingredient'].to_numpy()[order]),
+                *(cls._number_column(meals[column].to_numpy()[order]) for column in ('Calories', 'Carbohydrates (g)', 'Protein (g)', 'Fat (g)')),
+            )
+        ]
+
+        boundaries = np.flatnonzero(days[1:] != days[:-1]) + 1
+        for start, end in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(days)]))):
+            day_label = days[start].item().strftime('%B %-d, %Y')
+            file.write(_DAY_START_TEMPLATE.format(date=day_label, label=day_label.translate(_LABEL_DELETIONS), columns=end - start))
+            file.write(''.join(blocks[start:end]))
+            file.write(_DAY_END)
+        file.write(_DOCUMENT_END)
+
+    @classmethod
+    def generate_tex(cls, meal_plan, filepath : str) -> None:
+        """
+        Writes the LaTeX source of the meal plan's document to filepath + '.tex', like Document.generate_tex.
+        Parameters:
+        - meal_plan: The meal plan object to write the document of.
+        - filepath (str): The path of the document, without extension.
+        Returns:
+        None
+        """
+        with open(filepath + '.tex', 'w', encoding='utf-8') as file:
+            cls.write_tex(meal_plan, file)
+
+    @staticmethod
+    def _escape_column(values : np.ndarray) -> list:
+        """
+        Escapes a column of strings for LaTeX, once per distinct value.
+        """
+        escaped = {value: escape_latex(value) for value in set(values)}
+        return [escaped[value] for value in values]
+
+    @staticmethod
+    def _label_column(values : np.ndarray) -> list:
+        """
+        Turns a column of strings into the section labels pylatex derives from them, once per distinct value.
+        """
+        labels = {value: escape_latex(''.join(c for c in value.translate(_LABEL_DELETIONS) if 32 <= ord(c) < 127)) for value in set(values)}
+        return [labels[value] for value in values]
+
+    @staticmethod
+    def _number_column(values : np.ndarray) -> np.ndarray:
+        """
+        Formats a numeric column like bold(round(value, 1)): integers as they are, other numbers to one decimal.
+        """
+        strings = values.astype(str) if values.dtype.kind in 'iu' else np.char.mod('%.1f', values)
+        return np.char.replace(strings, '-', '{-}')
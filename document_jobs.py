@@ -0,0 +1,167 @@
+import io
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+from pdf_builder import PDFBuilder
+
+class DocumentJobQueue:
+    """
+    Builds meal plan documents in the background.
+
+    Submitting a document renders its LaTeX source, which takes milliseconds, and hands the compilation to a
+    PDFBuilder, so the caller gets a job id back without waiting for LaTeX.  Every job is recorded as a JSON file in
+    the job store, so its status can be polled from any process.  A failed or stuck compilation is killed after the
+    timeout and retried.
+
+    Job statuses: 'building' (waiting for or in compilation), 'done' (with the path of the PDF) and 'failed'
+    (with the error).
+    """
+    JOBS_DIR = "output/.jobs"
+    FINISHED = ('done', 'failed')
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, builder : PDFBuilder = None, jobs_dir : str = JOBS_DIR, retries : int = 2, timeout : float = 120) -> None:
+        """
+        Initializes the queue.
+        Parameters:
+        - builder (PDFBuilder): The builder compiling the documents.  Defaults to one with a worker per core.
+        - jobs_dir (str): Directory of the job store.
+        - retries (int): Number of times a failed compilation is tried again.
+        - timeout (float): Seconds after which a compilation is considered stuck and killed.
+        """
+        assert retries >= 0, "Retries must not be negative"
+        self.builder = builder if builder is not None else PDFBuilder(timeout=timeout)
+        self.jobs_dir = jobs_dir
+        self.retries = retries
+        self._events = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        """
+        Returns the process-wide job queue, creating it on first use.
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def submit(self, meal_plan, filepath : str = None, on_done=None) -> str:
+        """
+        Queues the build of a meal plan's document.
+        Parameters:
+        - meal_plan (MealPlan): The meal plan to build the document of.
+        - filepath (str): The path of the document, without extension.  Defaults to the customer's output path.
+        - on_done (callable): Called with the finished job's record, in a worker thread (or right away if the PDF
+                              was cached).
+        Returns:
+        - str: The id of the job.
+        """
+        from document_generator import DocumentGenerator
+
+        filepath = filepath if filepath is not None else PDFBuilder.output_path(meal_plan.customer)
+        buffer = io.StringIO()
+        DocumentGenerator.write_tex(meal_plan, buffer)
+
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'status': 'building',
+            'document': filepath,
+            'attempts': 0,
+            'pdf': None,
+            'error': None,
+            'created': time.time(),
+        }
+        with self._lock:
+            self._events[job_id] = threading.Event()
+        self._start(job, buffer.getvalue(), on_done)
+        return job_id
+
+    def status(self, job_id : str) -> dict:
+        """
+        Returns the record of a job.
+        Raises:
+        - KeyError: If there is no such job.
+        """
+        try:
+            with open(self._job_path(job_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(job_id)
+
+    def wait(self, job_id : str, timeout : float = None) -> dict:
+        """
+        Waits for a job to finish.
+        Parameters:
+        - job_id (str): The id of the job.
+        - timeout (float): Seconds to wait at most.  Waits indefinitely by default.
+        Returns:
+        - dict: The record of the job, which is still unfinished if the timeout expired.
+        """
+        event = self._events.get(job_id)
+        if event is not None:
+            event.wait(timeout)
+            return self.status(job_id)
+
+        # Jobs of other processes are only visible through the store.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.status(job_id)
+            if job['status'] in self.FINISHED or (deadline is not None and time.monotonic() >= deadline):
+                return job
+            time.sleep(0.1)
+
+    def _start(self, job : dict, tex : str, on_done) -> None:
+        """
+        Starts an attempt of a job and schedules its follow-up.
+        """
+        job['attempts'] += 1
+        job['status'] = 'building'
+        job['started'] = time.time()
+        self._save(job)
+
+        def finish(build) -> None:
+            try:
+                job['pdf'] = build.result()
+                job['status'] = 'done'
+                job['error'] = None
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+                job['error'] = f"{type(e).__name__}: {e}"
+                if job['attempts'] <= self.retries:
+                    self._start(job, tex, on_done)
+                    return
+                job['status'] = 'failed'
+            except Exception as e:
+                # Such as a missing compiler: trying again cannot help.
+                job['status'], job['error'] = 'failed', f"{type(e).__name__}: {e}"
+            job['finished'] = time.time()
+            self._save(job)
+            with self._lock:
+                event = self._events.pop(job['id'])
+            event.set()
+            if on_done is not None:
+                on_done(job)
+
+        self.builder.submit_tex(tex, job['document']).add_done_callback(finish)
+
+    def _job_path(self, job_id : str) -> str:
+        return os.path.join(self.jobs_dir, os.path.basename(job_id) + '.json')
+
+    def _save(self, job : dict) -> None:
+        """
+        Writes a job's record so that readers never see it half-written.
+        """
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=self.jobs_dir, suffix='.part')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(job, f)
+        os.replace(temporary, self._job_path(job['id']))
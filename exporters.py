@@ -0,0 +1,227 @@
+import os
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+FLOAT_DECIMALS = 2
+
+def round_floats(df : pd.DataFrame, decimals : int = FLOAT_DECIMALS) -> pd.DataFrame:
+    """
+    Rounds the float columns of a plan, so that e.g. 85.61243879999999 grams are exported as 85.61.
+    """
+    floats = df.select_dtypes('float').columns
+    return df.round({column: decimals for column in floats}) if len(floats) else df
+
+class PlanExporter(ABC):
+    """
+    Writes meal plans to a file, one chunk of rows at a time, so that any number of plans can be exported with the
+    memory of a single chunk.  Every write appends the chunk to the file; the file is complete once closed.
+
+    Use as a context manager:
+        with open_exporter('output/meal_plans.parquet') as exporter:
+            for plans in chunks:
+                exporter.write(plans)
+    """
+    extensions = ()
+
+    def __init__(self, path : str) -> None:
+        """
+        Initializes the exporter.
+        Parameters:
+        - path (str): Path of the file to write.  Its directory is created if needed.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, plans : pd.DataFrame) -> None:
+        """
+        Appends plan rows to the file.
+        """
+        plans = round_floats(plans)
+        self._write(plans)
+        self.rows += len(plans)
+
+    @abstractmethod
+    def _write(self, plans : pd.DataFrame) -> None:
+        """
+        Appends rounded plan rows to the file.
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Finishes the file.
+        """
+
+class CSVExporter(PlanExporter):
+    """
+    Writes plans as CSV, with a header line before the first rows.
+    """
+    extensions = ('.csv',)
+
+    def __init__(self, path : str) -> None:
+        super().__init__(path)
+        self._file = open(path, 'w', newline='')
+
+    @staticmethod
+    def format(plans : pd.DataFrame):
+        """
+        Formats plan rows as CSV, e.g. in a worker process.
+        Returns:
+        - tuple: The header line and the rows.
+        """
+        plans = round_floats(plans)
+        return plans.iloc[:0].to_csv(index=False), plans.to_csv(index=False, header=False)
+
+    def write_formatted(self, header : str, rows : str, count : int) -> None:
+        """
+        Appends `count` rows already formatted by CSVExporter.format.
+        """
+        if self._file.tell() == 0:
+            self._file.write(header)
+        self._file.write(rows)
+        self.rows += count
+
+    def _write(self, plans : pd.DataFrame) -> None:
+        plans.to_csv(self._file, index=False, header=self._file.tell() == 0)
+
+    def close(self) -> None:
+        self._file.close()
+
+class JSONLExporter(PlanExporter):
+    """
+    Writes plans as JSON Lines, one meal per line with ISO dates.
+    """
+    extensions = ('.jsonl', '.ndjson')
+
+    def __init__(self, path : str) -> None:
+        super().__init__(path)
+        self._file = open(path, 'w')
+
+    def _write(self, plans : pd.DataFrame) -> None:
+        if len(plans):
+            lines = plans.to_json(orient='records', lines=True, date_format='iso')
+            # Recent pandas versions end the lines with a newline, older ones do not.
+            self._file.write(lines if lines.endswith('\n') else lines + '\n')
+
+    def close(self) -> None:
+        self._file.close()
+
+class _ArrowExporter(PlanExporter):
+    """
+    Base of the exporters writing through pyarrow.  The schema of the file is the schema of the first chunk.
+    """
+    def __init__(self, path : str) -> None:
+        """
+        Raises:
+        - ModuleNotFoundError: If pyarrow is not installed.
+        """
+        try:
+            import pyarrow
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError(f"Exporting to {os.path.basename(path)} requires pyarrow.  Install it with: pip install pyarrow")
+        super().__init__(path)
+        self._pyarrow = pyarrow
+        self._writer = None
+
+    def _write(self, plans : pd.DataFrame) -> None:
+        table = self._pyarrow.Table.from_pandas(plans, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = self._open(self._schema)
+        self._writer.write_table(table.cast(self._schema))
+
+    @abstractmethod
+    def _open(self, schema):
+        """
+        Returns the pyarrow writer of the file.
+        """
+
+    def close(self) -> None:
+        # Without any chunk there is no schema, so no file is written.
+        if self._writer is not None:
+            self._writer.close()
+
+class ParquetExporter(_ArrowExporter):
+    """
+    Writes plans as Parquet, one row group per chunk.
+    """
+    extensions = ('.parquet',)
+
+    def _open(self, schema):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(self.path, schema)
+
+class ArrowExporter(_ArrowExporter):
+    """
+    Writes plans in the Arrow IPC file format, one record batch per chunk.  The file is uncompressed, so readers
+    can memory-map it without copies:
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+    """
+    extensions = ('.arrow', '.feather', '.ipc')
+
+    def _open(self, schema):
+        import pyarrow.ipc
+        return pyarrow.ipc.new_file(self.path, schema)
+
+class SQLiteExporter(PlanExporter):
+    """
+    Stores plans in a PlanStore.  Unlike the other exporters it does not overwrite the file: the plans are added to
+    the store, replacing the stored plans of the same customers.  Plans need the 'Customer' column.
+    """
+    extensions = ('.sqlite', '.db')
+
+    def __init__(self, path : str) -> None:
+        super().__init__(path)
+        from plan_store import PlanStore
+        self._store = PlanStore(path)
+
+    def _write(self, plans : pd.DataFrame) -> None:
+        self._store.save(plans)
+
+    def close(self) -> None:
+        self._store.close()
+
+EXPORTERS = {
+    'csv': CSVExporter,
+    'jsonl': JSONLExporter,
+    'parquet': ParquetExporter,
+    'arrow': ArrowExporter,
+    'sqlite': SQLiteExporter,
+}
+
+def export_format(path : str) -> str:
+    """
+    Returns the export format of a file, told from its extension.
+    Raises:
+    - ValueError: If the extension is not one of an exporter.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    format = next((name for name, exporter in EXPORTERS.items() if extension in exporter.extensions), None)
+    if format is None:
+        raise ValueError(f"Cannot tell the export format of {path}.  Use one of {', '.join(EXPORTERS)}")
+    return format
+
+def open_exporter(path : str, format : str = None) -> PlanExporter:
+    """
+    Opens an exporter for the given file.
+    Parameters:
+    - path (str): Path of the file to write.
+    - format (str): One of the keys of EXPORTERS.  Defaults to the format of the file's extension.
+    Returns:
+    - PlanExporter: The exporter, to be closed when all plans are written.
+    Raises:
+    - ValueError: If the format is unknown or cannot be told from the extension.
+    """
+    format = format if format is not None else export_format(path)
+    if format not in EXPORTERS:
+        raise ValueError(f"Unknown export format {format}.  Use one of {', '.join(EXPORTERS)}")
+    return EXPORTERS[format](path)
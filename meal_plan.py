@@ -0,0 +1,657 @@
+import pandas as pd
+import numpy as np
+from datetime import datetime
+from functools import lru_cache
+
+from config import MealType, MealFrequency, MealObjective, bcolors, CALORIES_PER_MEAL, GRAMS_PER_CALORIE, MEAL_TIMES
+from catalog import MealCatalog
+from customer import Customer
+from optimizer import MealOptimizer
+from exporters import open_exporter
+from metrics import Metrics
+from pricing import PriceTable
+from sampler import MealSampler
+from questionnaire_utils import QuestionnaireUtils
+
+class MealPlan:
+    customer : Customer
+    catalog : MealCatalog
+    meals : pd.DataFrame
+    positions : np.ndarray
+    schedule : np.ndarray
+    calories : np.ndarray
+    
+    def __init__(self, customer : Customer, catalog : MealCatalog = None) -> None:
+        """
+        Initializes an instance of the class with the shared meal catalog.
+
+        Parameters:
+        - customer (Customer): The customer object.
+        - catalog (MealCatalog): The catalog to plan from.  Defaults to the process-wide catalog.
+
+        Returns:
+        - None
+        """
+        assert type(customer) == Customer, "Customer must be a Customer object"
+        self.customer = customer
+        self.catalog = catalog if catalog is not None else MealCatalog.get()
+        assert type(self.dataset) == pd.DataFrame, f"Expected DataFrame, got {type(self.dataset)}"
+        assert len(self.dataset) > 0, "Raw dataset is empty"
+        self.meals = pd.DataFrame()
+        self.positions = None
+        self._meals_list = None
+        self._inputs = None
+    
+    @property
+    def dataset(self) -> pd.DataFrame:
+        """
+        The catalog's meals.  Shared with every other plan, so it must not be modified.
+        """
+        return self.catalog.meals
+
+    @property
+    def catalog_version(self) -> str:
+        """
+        The version of the catalog the plan is built from.  A plan keeps its catalog when a newer one is loaded.
+        """
+        return self.catalog.version
+
+    @property
+    def meals_list(self) -> pd.DataFrame:
+        """
+        The plan's meals: one row per meal with the catalog's columns, 'Date', 'Calories' and the grams of each macro.
+
+        A generated plan only keeps the int32 catalog positions, meal times and calories of its meals, and builds
+        this DataFrame from them on every access.  Changes to it are kept only if the DataFrame is assigned back.
+        """
+        if self._meals_list is not None:
+            return self._meals_list
+        if self.positions is None:
+            raise AttributeError("The meal plan has not been generated yet")
+        return MealPlan._materialize(self.catalog, self.positions, self.schedule, self.calories)
+
+    @meals_list.setter
+    def meals_list(self, meals_list : pd.DataFrame) -> None:
+        self._meals_list = meals_list
+        
+    def generate_meal_plan(self, optimize : bool = False, seed : int = None):
+        """
+        Generates a meal plan based on the customer's preferences and dietary restrictions.  For the complete meal plan generation, please refer to the documentation.
+        Parameters:
+        - optimize (bool): If True, meals are chosen by the MealOptimizer to meet the objective's macro split and
+                           calorie target instead of being sampled by the MealSampler.
+        - seed (int): Seed of the random generator, for reproducible plans.
+        Returns:
+            pandas.DataFrame: A DataFrame containing the generated meal plan.
+        """
+        rng = np.random.default_rng(seed)
+        candidates = self.catalog.candidates(self.customer.type, self.customer.allergies)
+        if len(candidates) == 0:
+            print(f"{bcolors.FAIL}ERROR: Not enough meals in the dataset to generate a meal plan.  Our fault!{bcolors.ENDC}")
+            return None
+        Metrics.observe('candidate_pool_size', len(candidates))
+        
+        with Metrics.stage('schedule'):
+            meal_schedule, meals_per_day, num_days = self._get_meal_schedule()
+        
+        if optimize:
+            with Metrics.stage('optimize'):
+                positions = MealOptimizer(self.catalog).optimize(candidates, num_days, meals_per_day, self.customer.objective, rng=rng)[0]
+        else:
+            sampler = MealSampler()
+            if sampler.effective_window(len(candidates)) < min(sampler.repeat_window, len(meal_schedule)):
+                print(f"{bcolors.WARNING}WARNING: Only {len(candidates)} meals match your preferences, so meals repeat every {len(candidates)} meals.{bcolors.ENDC}")
+            with Metrics.stage('sample'):
+                positions = sampler.sample(candidates, len(meal_schedule), rng=rng)[0]
+        if Metrics.enabled:
+            Metrics.count('repeats', MealSampler.repeats(positions))
+        
+        with Metrics.stage('calories'):
+            if optimize:
+                calories = np.full(len(positions), MealOptimizer.calories_per_meal(self.customer.objective, self.customer.frequency))
+            else:
+                calories = self._draw_calories(len(positions), rng)
+        Metrics.count('plans_generated')
+        
+        self.positions = positions.astype(np.int32)
+        self.schedule = meal_schedule
+        self.calories = calories.astype(np.int32)
+        self._meals_list = None
+        self._inputs = self._preferences()
+        self._optimize = optimize
+        self._rng = rng
+        self.total_cost = float(self.prices().totals[0])
+
+        meals_list = self.meals_list
+        assert type(meals_list) == pd.DataFrame, f"Expected DataFrame, got {type(meals_list)}"
+        assert len(meals_list) > 0, "No meals generated"
+        return meals_list
+    
+    def update(self):
+        """
+        Brings a generated plan up to date with the customer's current preferences, recomputing only what the
+        changed preferences affect:
+        - Meal type: the whole plan is generated again.
+        - Allergies: only the meals containing a newly added allergen are replaced.  In pools too small to keep the
+          repeat window that way, the plan is sampled again from the first meal that cannot be replaced.
+        - Frequency or dates: the schedule is rebuilt and the sequence of meals is kept, truncated or extended to the
+          new number of slots.  When only the ending date changed, the existing slots keep their meals and calories.
+        - Objective or frequency: the calories are drawn again.
+        Optimized plans are generated again on any change, since the optimizer balances whole days.
+        Returns:
+            pandas.DataFrame: The updated meal plan.
+        """
+        if self._inputs is None:
+            raise AttributeError("The meal plan has not been generated yet")
+        inputs = self._preferences()
+        changed = {name for name, value in inputs.items() if value != self._inputs[name]}
+        if not changed:
+            return self.meals_list
+        if 'type' in changed or self._optimize:
+            return self.generate_meal_plan(optimize=self._optimize, seed=self._rng)
+
+        candidates = self.catalog.candidates(self.customer.type, self.customer.allergies)
+        if len(candidates) == 0:
+            print(f"{bcolors.FAIL}ERROR: Not enough meals in the dataset to generate a meal plan.  Our fault!{bcolors.ENDC}")
+            return None
+        sampler = MealSampler()
+        positions, schedule, calories = self.positions, self.schedule, self.calories
+
+        added_allergies = inputs['allergies'] - self._inputs['allergies']
+        if added_allergies:
+            with Metrics.stage('sample'):
+                slots = np.flatnonzero(self.catalog.contains_allergens(positions, added_allergies))
+                positions = sampler.resample(positions, slots, candidates, self._rng)
+
+        if changed & {'frequency', 'starting_date', 'ending_date'}:
+            with Metrics.stage('schedule'):
+                schedule = self._get_meal_schedule()[0]
+            with Metrics.stage('sample'):
+                positions = sampler.extend(positions, len(schedule), candidates, self._rng)
+
+        with Metrics.stage('calories'):
+            if changed & {'objective', 'frequency', 'starting_date'}:
+                calories = self._draw_calories(len(schedule), self._rng)
+            elif len(schedule) != len(calories):
+                kept = calories[:len(schedule)]
+                calories = np.concatenate([kept, self._draw_calories(len(schedule) - len(kept), self._rng)])
+        Metrics.count('plans_updated')
+
+        self.positions = positions.astype(np.int32)
+        self.schedule = schedule
+        self.calories = calories.astype(np.int32)
+        self._meals_list = None
+        self._inputs = inputs
+        self.total_cost = float(self.prices().totals[0])
+        return self.meals_list
+
+    def extend(self, ending_date : datetime):
+        """
+        Renews the subscription until a later ending date.  The new days are appended to the plan and the
+        existing days are left as they are.
+        Parameters:
+        - ending_date (datetime): The new ending date.
+        Returns:
+            pandas.DataFrame: The extended meal plan.
+        """
+        assert ending_date > self.customer.ending_date, "The new ending date must be after the current one"
+        self.customer.ending_date = ending_date
+        return self.update()
+
+    def similar_meals(self, slot : int, k : int = 5) -> pd.DataFrame:
+        """
+        Finds the meals that can replace the meal of a slot: the k meals with the closest macro split among the
+        meals of the plan's type without the plan's allergens, leaving out the meals served within the repeat window
+        around the slot.
+        Parameters:
+        - slot (int): Position of the meal in the plan.
+        - k (int): Number of meals to return.
+        Returns:
+            pandas.DataFrame: The catalog rows of the meals, closest first, with their 'Distance' to the slot's
+            macro split in percentage points.
+        """
+        positions, distances = self._similar(slot, k)
+        return self.dataset.iloc[positions].assign(Distance=distances)
+
+    def swap_meal(self, slot : int, choice : int = 0, k : int = 5) -> pd.DataFrame:
+        """
+        Replaces the meal of a slot with one of the meals listed by similar_meals.  The slot keeps its time and
+        calories, and the grams of each macro are recomputed from the new meal's split.
+        Parameters:
+        - slot (int): Position of the meal in the plan.
+        - choice (int): Index of the new meal among the k similar meals, 0 for the closest.
+        - k (int): Number of similar meals to choose from.
+        Returns:
+            pandas.DataFrame: The meals of the slot's day, as in meals_list.
+        """
+        positions = self._similar(slot, k)[0]
+        if len(positions) == 0:
+            raise ValueError(f"No other meal can replace the meal of slot {slot}")
+        assert 0 <= choice < len(positions), f"Choice must be between 0 and {len(positions) - 1}"
+        self.positions = self.positions.copy()
+        self.positions[slot] = positions[choice]
+        self._meals_list = None
+        self.total_cost = float(self.prices().totals[0])
+        Metrics.count('meals_swapped')
+
+        day = self.schedule.astype('datetime64[D]')
+        same_day = np.flatnonzero(day == day[slot])
+        return MealPlan._materialize(self.catalog, self.positions[same_day], self.schedule[same_day], self.calories[same_day])
+
+    def prices(self, table : PriceTable = None):
+        """
+        Prices the plan.
+        Parameters:
+        - table (PriceTable): The prices.  Defaults to the process-wide price table.
+        Returns:
+            PlanPrices: The price of the plan and of each of its days.  Plans whose meals_list was assigned are
+            priced from the SKUs and dates of its rows.
+        """
+        table = table if table is not None else PriceTable.get()
+        if self._meals_list is None:
+            if self.positions is None:
+                raise AttributeError("The meal plan has not been generated yet")
+            positions, schedule = self.positions, self.schedule
+        else:
+            positions = pd.Index(self.dataset['SKU']).get_indexer(self._meals_list['SKU'])
+            assert (positions >= 0).all(), "The plan has meals that are not in its catalog"
+            schedule = self._meals_list['Date'].to_numpy()
+        customer_id = self.customer.customer_id or self.customer.profile['name']
+        return table.price(self.catalog, [customer_id], positions, [schedule], np.zeros(1, dtype=np.int32))
+
+    def _similar(self, slot : int, k : int):
+        """
+        Returns the catalog positions of the k meals most similar to the meal of a slot, and their distances.
+        """
+        if self._inputs is None:
+            raise AttributeError("The meal plan has not been generated yet")
+        assert 0 <= slot < len(self.positions), f"Slot must be between 0 and {len(self.positions) - 1}"
+        index = self.catalog.macro_index(self._inputs['type'], self._inputs['allergies'])
+        recent_size = MealSampler().effective_window(len(index)) - 1
+        nearby = self.positions[max(0, slot - recent_size):slot + recent_size + 1]
+        with Metrics.stage('swap'):
+            return index.query(self.catalog.macros[self.positions[slot]], k, exclude=np.union1d(nearby, self.positions[slot]))
+
+    def _preferences(self) -> dict:
+        """
+        Returns the customer's preferences the plan is generated from.
+        """
+        return {
+            'type': self.customer.type,
+            'allergies': frozenset(self.customer.allergies),
+            'objective': self.customer.objective,
+            'frequency': self.customer.frequency,
+            'starting_date': self.customer.starting_date,
+            'ending_date': self.customer.ending_date,
+        }
+
+    @classmethod
+    def generate_batch(cls, customers : list, catalog : MealCatalog = None, seed : int = None, optimizer : MealOptimizer = None, sampler : MealSampler = None) -> pd.DataFrame:
+        """
+        Generates the meal plans of many customers in one pass.  See generate_compact_batch.
+        Returns:
+            pandas.DataFrame: The plans of all customers, one row per meal, with the customer id in the 'Customer' column.
+        """
+        return cls.generate_compact_batch(customers, catalog, seed, optimizer, sampler).to_frame()
+
+    @classmethod
+    def generate_compact_batch(cls, customers : list, catalog : MealCatalog = None, seed : int = None, optimizer : MealOptimizer = None, sampler : MealSampler = None) -> "PlanBatch":
+        """
+        Generates the meal plans of many customers in one pass.  Schedules are shared between customers with
+        the same frequency and dates, meals are chosen with one draw per candidate pool for all
+        customers sharing it, and calories are assigned to every row of the batch at once.
+        Parameters:
+        - customers (list[Customer]): The customers to generate plans for.
+        - catalog (MealCatalog): The catalog to plan from.  Defaults to the process-wide catalog.
+        - seed (int): Seed of the random generator, for reproducible batches.
+        - optimizer (MealOptimizer): If given, meals are chosen by the optimizer to meet each customer's macro
+                                     split and calorie target instead of being sampled.
+        - sampler (MealSampler): The sampler used without an optimizer.  Defaults to a MealSampler with the default repeat window.
+        Returns:
+            PlanBatch: The plans of all customers as catalog positions, meal times and calories.
+        """
+        catalog = catalog if catalog is not None else MealCatalog.get()
+        sampler = sampler if sampler is not None else MealSampler()
+        rng = np.random.default_rng(seed)
+        
+        with Metrics.stage('schedule'):
+            schedule_hits = cls._build_meal_schedule.cache_info().hits if Metrics.enabled else 0
+            plan_schedules = []
+            for customer in customers:
+                assert type(customer) == Customer, "Customer must be a Customer object"
+                plan_schedules.append(cls._build_meal_schedule(customer.frequency, customer.starting_date, customer.ending_date))
+        if Metrics.enabled:
+            Metrics.count('schedule_cache_hits', cls._build_meal_schedule.cache_info().hits - schedule_hits)
+        
+        pools = {}
+        for i, customer in enumerate(customers):
+            pool_key = (customer.type, frozenset(customer.allergies))
+            if len(catalog.candidates(*pool_key)) == 0:
+                print(f"{bcolors.FAIL}ERROR: Not enough meals in the dataset to generate a meal plan for {customer.customer_id or customer.profile['name']}.  Our fault!{bcolors.ENDC}")
+                plan_schedules[i] = plan_schedules[i][:0]
+                continue
+            group_key = (pool_key, len(plan_schedules[i]))
+            if optimizer is not None:
+                group_key += (customer.frequency, customer.objective)
+            pools.setdefault(group_key, []).append(i)
+        
+        lengths = np.array([len(schedule) for schedule in plan_schedules], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        positions = np.empty(offsets[-1], dtype=np.int64)
+        for group_key, members in pools.items():
+            pool_key, length = group_key[:2]
+            candidates = catalog.candidates(*pool_key)
+            rows = offsets[members][:, None] + np.arange(length)
+            if optimizer is not None:
+                meals_per_day = len(MEAL_TIMES[group_key[2]])
+                with Metrics.stage('optimize'):
+                    positions[rows] = optimizer.optimize(candidates, length // meals_per_day, meals_per_day, group_key[3], count=len(members), rng=rng)
+            else:
+                with Metrics.stage('sample'):
+                    positions[rows] = sampler.sample(candidates, length, count=len(members), rng=rng)
+            if Metrics.enabled:
+                Metrics.observe('candidate_pool_size', len(candidates))
+                Metrics.count('repeats', MealSampler.repeats(positions[rows]))
+                Metrics.count('plans_generated', len(members))
+        
+        with Metrics.stage('calories'):
+            if optimizer is not None:
+                per_customer = [MealOptimizer.calories_per_meal(customer.objective, customer.frequency) for customer in customers]
+                calories = np.repeat(np.array(per_customer, dtype=np.int64), lengths)
+            else:
+                ranges = np.array([CALORIES_PER_MEAL[(customer.objective, customer.frequency)] for customer in customers], dtype=np.int64).reshape(-1, 2)
+                calories = rng.integers(np.repeat(ranges[:, 0], lengths), np.repeat(ranges[:, 1], lengths))
+        
+        # Customers with the same frequency and dates share the cached schedule array.
+        schedule_ids, schedules = {}, []
+        for schedule in plan_schedules:
+            if id(schedule) not in schedule_ids:
+                schedule_ids[id(schedule)] = len(schedules)
+                schedules.append(schedule)
+        return PlanBatch(
+            catalog,
+            [customer.customer_id or customer.profile['name'] for customer in customers],
+            positions.astype(np.int32),
+            calories.astype(np.int32),
+            schedules,
+            np.array([schedule_ids[id(schedule)] for schedule in plan_schedules], dtype=np.int32),
+        )
+
+    @classmethod
+    def from_meals(cls, customer : Customer, meals : pd.DataFrame, catalog : MealCatalog = None):
+        """
+        Creates the meal plan of a customer from their rows of a generate_batch result.
+
+        Parameters:
+        - customer (Customer): The customer object.
+        - meals (pd.DataFrame): The customer's meals, with or without the 'Customer' column.
+        - catalog (MealCatalog): The catalog the plan was generated from.
+
+        Returns:
+        - MealPlan: The meal plan.
+        """
+        meal_plan = cls(customer, catalog)
+        meal_plan.meals_list = meals.drop(columns='Customer', errors='ignore').reset_index(drop=True)
+        meal_plan.total_cost = float(meal_plan.prices().totals[0])
+        return meal_plan
+    
+    def ask_to_generate_document(self):
+        """
+        Asks the user if they would like to generate a PDF document for their meal plan.
+        Returns:
+            bool: True if the user wants to generate the document, False otherwise.
+        """
+        generate = QuestionnaireUtils.ask_multiple_choice_question("Would you like to generate a PDF document for your meal plan?",{"Yes":True, "No":False})
+        if generate:
+            # Loaded here so that pylatex is only imported when a document is requested.
+            from document_jobs import DocumentJobQueue
+            job_id = DocumentJobQueue.get().submit(self, on_done=MealPlan._open_document)
+            print(f"Generating PDF document in the background (job {job_id}).  It will open when ready.")
+        return generate
+
+    @staticmethod
+    def _open_document(job : dict) -> None:
+        """
+        Opens a finished document job's PDF, or reports why it failed.
+        """
+        if job['status'] != 'done':
+            print(f"{bcolors.FAIL}An error has occurred when generating the document.  Make sure that  the Latex compiler is installed{bcolors.ENDC}")
+            return
+        import subprocess
+        try:
+            subprocess.Popen(['xdg-open', job['pdf']], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError:
+            print(f"{bcolors.OKGREEN}Your document is ready: {job['pdf']}{bcolors.ENDC}")
+
+    def print_meal_plan(self):
+        """
+        Print the meal plan for the customer.
+
+        This method prints the customer's meal plan, including the meal type, objective, frequency,
+        date covered, total costs, and the list of meals for each date.
+
+        Parameters:
+        - self: The instance of the class.
+
+        Returns:
+        - None
+        """
+        with Metrics.stage('print'):
+            print("YOUR MEAL PLAN")
+            print('Meal Type:', f"{bcolors.OKCYAN}{MealType[self.customer.type].value}{bcolors.ENDC}", sep='\t')
+            print('Objective:', f"{bcolors.OKCYAN}{MealObjective[self.customer.objective].value}{bcolors.ENDC}", sep='\t')
+            print('Frequency:', f"{bcolors.OKCYAN}{MealFrequency[self.customer.frequency].value}{bcolors.ENDC}", sep='\t')
+            print('Date Covered:', f'{bcolors.OKCYAN}{self.customer.starting_date.strftime('%B %-d, %Y')} - {self.customer.ending_date.strftime('%B %-d, %Y')}{bcolors.ENDC}', sep='\t')
+            print('Total Costs:', f'{bcolors.OKCYAN}Php {self.total_cost:.2f}{bcolors.ENDC}', sep='\t')
+            print()
+            meals_list = self.meals_list
+            for date, meals in meals_list.groupby(meals_list['Date'].dt.date):
+                print(f"{bcolors.OKCYAN}{date.strftime('%B %-d, %Y')}{bcolors.ENDC}")
+                for index, row in meals.iterrows():
+                    print(f"\t{bcolors.OKGREEN}{row['Meal']}{bcolors.ENDC} ({row['Main Ingredient']})")
+                    print(f"\t  {bcolors.GRAY}{row['Calories']:.1f} calories | {round(row['Carbohydrates (g)'],1)}g of cargs | {round(row['Protein (g)'],1)}g of protein | {round(row['Fat (g)'],1)}g of fat |{bcolors.ENDC}")
+            
+    def save_meal_plan(self, format : str = 'csv', path : str = None):
+        """
+        Save the meal plan to a file.
+
+        Parameters:
+        - format (str): The file format, one of the keys of exporters.EXPORTERS ('csv', 'jsonl', 'parquet', 'arrow'
+                        or 'sqlite').  With 'sqlite', the plan is added to the plan store shared by all customers.
+        - path (str): The path of the file.  Defaults to output/plans/<customer>.<format>, so plans of different
+                      customers do not overwrite each other, or to output/plans.sqlite for the plan store.
+
+        Returns:
+        - str: The path of the saved file.
+        """
+        import os
+        with Metrics.stage('save'):
+            meals_list = self.meals_list
+            if format == 'sqlite':
+                from plan_store import PlanStore
+                path = path if path is not None else PlanStore.PATH
+                meals_list = meals_list.assign(Customer=self.customer.customer_id or self.customer.profile['name'])
+            path = path if path is not None else os.path.join('output', 'plans', f'{self.customer.file_stem()}.{format}')
+            with open_exporter(path, format) as exporter:
+                exporter.write(meals_list)
+        print()
+        print(f"{bcolors.OKGREEN}Meal plan saved to {os.path.abspath(path)}{bcolors.ENDC}")
+        print()
+        return path
+    
+    def _get_meal_schedule(self):
+        """
+        Generates a meal schedule based on the customer's frequency, starting date, and ending date.
+        Returns:
+            meal_schedule (np.ndarray): A read-only datetime64 array of the scheduled meal times.
+            meals_per_day (int): The number of meals per day based on the customer's frequency.
+            num_days (int): The total number of days in the meal schedule.
+        """
+        schedule_hits = MealPlan._build_meal_schedule.cache_info().hits if Metrics.enabled else 0
+        meal_schedule = MealPlan._build_meal_schedule(self.customer.frequency, self.customer.starting_date, self.customer.ending_date)
+        if Metrics.enabled:
+            Metrics.count('schedule_cache_hits', MealPlan._build_meal_schedule.cache_info().hits - schedule_hits)
+        meals_per_day = len(MEAL_TIMES[self.customer.frequency])
+        num_days = len(meal_schedule) // meals_per_day
+                
+        assert len(meal_schedule) == meals_per_day * num_days, "Incorrect number of meals in the schedule"
+        assert type(meal_schedule) == np.ndarray, f"Expected np.ndarray, got {type(meal_schedule)}"
+        assert type(meals_per_day) == int, f"Expected int, got {type(meals_per_day)}"
+        assert type(num_days) == int, f"Expected int, got {type(num_days)}"
+        
+        return meal_schedule, meals_per_day, num_days
+    
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _build_meal_schedule(frequency : str, starting_date, ending_date) -> np.ndarray:
+        """
+        Builds the meal times of every business day between the starting and ending dates by adding the
+        frequency's time offsets to each day.  Schedules are cached, so they are shared and read-only.
+        Parameters:
+        - frequency (str): Name of the MealFrequency.
+        - starting_date (datetime): First day of the schedule.
+        - ending_date (datetime): Last day of the schedule.
+        Returns:
+        - np.ndarray: The datetime64[ns] meal times in chronological order.
+        """
+        days = pd.date_range(starting_date, ending_date, freq='B').normalize().to_numpy()
+        offsets = np.array([np.timedelta64(int(time[:2]) * 60 + int(time[3:]), 'm') for time in MEAL_TIMES[frequency]], dtype='timedelta64[ns]')
+        meal_schedule = (days[:, None] + offsets[None, :]).ravel()
+        meal_schedule.flags.writeable = False
+        return meal_schedule
+    
+    def _add_calories(self, df, rng : np.random.Generator = None):
+        """
+        Adds calorie information to the given DataFrame based on the customer's objective and meal frequency.
+        Parameters:
+        - df: pandas DataFrame
+            The DataFrame containing the data to be modified.
+        - rng: np.random.Generator
+            The random generator to draw calories from.  Defaults to a fresh unseeded generator.
+        Returns:
+        - pandas DataFrame
+            The modified DataFrame with added calorie information.
+        Raises:
+        - None
+        """
+        df = MealPlan._with_macros(df, self._draw_calories(len(df), rng))
+        
+        assert type(df) == pd.DataFrame, f"Expected DataFrame, got {type(df)}"
+        assert len(df) > 0, "No calories added to the DataFrame"
+        return df
+    
+    def _draw_calories(self, count : int, rng : np.random.Generator = None) -> np.ndarray:
+        """
+        Draws the calories of `count` meals from the range of the customer's objective and meal frequency.
+        """
+        min_calories_per_meal, max_calories_per_meal = CALORIES_PER_MEAL[(self.customer.objective, self.customer.frequency)]
+        rng = rng if rng is not None else np.random.default_rng()
+        return rng.integers(min_calories_per_meal, max_calories_per_meal, count)
+
+    @staticmethod
+    def _materialize(catalog : MealCatalog, positions : np.ndarray, schedule : np.ndarray, calories : np.ndarray) -> pd.DataFrame:
+        """
+        Builds the DataFrame of meals from catalog positions, meal times and calories.
+        """
+        meals = catalog.meals.iloc[positions].reset_index(drop=True).assign(Date=schedule)
+        return MealPlan._with_macros(meals, calories.astype(np.int64))
+
+    @staticmethod
+    def _with_macros(df, calories):
+        """
+        Returns a copy of the DataFrame with the given calories and the grams of carbohydrates, protein and fat they contain.
+        Parameters:
+        - df (pandas.DataFrame): Meals with the 'Carbohydrate (%)', 'Protein (%)' and 'Fat (%)' columns.
+        - calories (np.ndarray): Calories of every row.
+        Returns:
+        - pandas.DataFrame: The DataFrame with the 'Calories', 'Carbohydrates (g)', 'Protein (g)' and 'Fat (g)' columns.
+        """
+        calories = np.asarray(calories)
+        percentages = df[['Carbohydrate (%)', 'Protein (%)', 'Fat (%)']].to_numpy(dtype=np.float64)
+        grams = calories[:, None] * (percentages / 100) * GRAMS_PER_CALORIE
+        return df.assign(**{
+            'Calories': calories,
+            'Carbohydrates (g)': grams[:, 0],
+            'Protein (g)': grams[:, 1],
+            'Fat (g)': grams[:, 2],
+        })
+
+class PlanBatch:
+    """
+    The plans of many customers, kept as the int32 catalog position and int32 calories of every meal: 8 bytes per
+    meal instead of a copy of the catalog row.  Names, types and macros stay in the catalog, and the meal times in
+    the schedules shared by the plans of the same frequency and dates.  They are only looked up when the plans are
+    materialized with to_frame, e.g. for display or export.
+
+    Meals are stored plan after plan; the meals of plan i are those between offsets[i] and offsets[i + 1], at the
+    times of schedules[schedule_ids[i]].
+    """
+    catalog : MealCatalog
+    customer_ids : list
+    positions : np.ndarray
+    calories : np.ndarray
+    schedules : list
+    schedule_ids : np.ndarray
+    offsets : np.ndarray
+
+    def __init__(self, catalog : MealCatalog, customer_ids : list, positions : np.ndarray, calories : np.ndarray, schedules : list, schedule_ids : np.ndarray) -> None:
+        """
+        Initializes the batch.
+        Parameters:
+        - catalog (MealCatalog): The catalog the positions point into.
+        - customer_ids (list[str]): The id of every plan's customer.
+        - positions (np.ndarray): The int32 catalog position of every meal.
+        - calories (np.ndarray): The int32 calories of every meal.
+        - schedules (list[np.ndarray]): The distinct datetime64 meal schedules of the plans.
+        - schedule_ids (np.ndarray): The index into `schedules` of every plan's schedule.
+        """
+        assert len(customer_ids) == len(schedule_ids), "Expected a schedule per customer"
+        self.catalog = catalog
+        self.customer_ids = customer_ids
+        self.positions = positions
+        self.calories = calories
+        self.schedules = schedules
+        self.schedule_ids = schedule_ids
+        self.offsets = np.concatenate(([0], np.cumsum([len(schedules[i]) for i in schedule_ids], dtype=np.int64)))
+        assert len(positions) == len(calories) == self.offsets[-1], "Expected a position and calories per meal"
+
+    def __len__(self) -> int:
+        """
+        Returns the number of plans.
+        """
+        return len(self.customer_ids)
+
+    @property
+    def catalog_version(self) -> str:
+        """
+        The version of the catalog the plans are built from.
+        """
+        return self.catalog.version
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The memory held by the meal arrays, in bytes.
+        """
+        return (self.positions.nbytes + self.calories.nbytes + self.schedule_ids.nbytes + self.offsets.nbytes
+                + sum(schedule.nbytes for schedule in self.schedules))
+
+    @property
+    def dates(self) -> np.ndarray:
+        """
+        The meal time of every meal.
+        """
+        if not len(self.schedule_ids):
+            return np.array([], dtype='datetime64[ns]')
+        return np.concatenate([self.schedules[i] for i in self.schedule_ids])
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Materializes the plans.
+        Returns:
+            pandas.DataFrame: The plans of all customers, one row per meal, with the customer id in the 'Customer' column.
+        """
+        plans = MealPlan._materialize(self.catalog, self.positions, self.dates, self.calories)
+        plans.insert(0, 'Customer', np.repeat(self.customer_ids, np.diff(self.offsets)))
+        assert type(plans) == pd.DataFrame, f"Expected DataFrame, got {type(plans)}"
+        return plans
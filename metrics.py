@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+class MetricsHook:
+    """
+    Receives the measurements of the meal plan pipeline.  Subclass it and register an instance with
+    Metrics.add_hook to collect them.
+    """
+    def on_stage(self, stage : str, start : float, seconds : float) -> None:
+        """
+        Called when a pipeline stage finishes.
+        Parameters:
+        - stage (str): Name of the stage, e.g. 'schedule'.
+        - start (float): time.perf_counter() at the start of the stage.
+        - seconds (float): Duration of the stage.
+        """
+
+    def on_count(self, name : str, value : int) -> None:
+        """
+        Called when a counter is incremented, e.g. 'plans_generated'.
+        """
+
+    def on_observe(self, name : str, value : float) -> None:
+        """
+        Called when a value is observed, e.g. 'candidate_pool_size'.
+        """
+
+class _Stage:
+    """
+    Times a stage and reports it to the hooks.
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name : str) -> None:
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        seconds = time.perf_counter() - self.start
+        for hook in Metrics.hooks:
+            hook.on_stage(self.name, self.start, seconds)
+
+_DISABLED_STAGE = nullcontext()
+
+class Metrics:
+    """
+    Instrumentation of the meal plan pipeline.
+
+    The pipeline reports stage timings, counters and observed values here, and they are passed on to the
+    registered hooks.  Without hooks, which is the default, Metrics.enabled is False, stage() returns a shared
+    no-op context manager and count() and observe() return at once.  Measurements that cost something to compute
+    are guarded by Metrics.enabled at the call site.
+    """
+    hooks : tuple = ()
+    enabled : bool = False
+    _lock = threading.Lock()
+
+    @classmethod
+    def add_hook(cls, hook : MetricsHook) -> MetricsHook:
+        """
+        Registers a hook and enables the instrumentation.
+        Returns:
+        - MetricsHook: The hook, for chaining.
+        """
+        with cls._lock:
+            cls.hooks = cls.hooks + (hook,)
+            cls.enabled = True
+        return hook
+
+    @classmethod
+    def remove_hook(cls, hook : MetricsHook) -> None:
+        """
+        Unregisters a hook.  The instrumentation is disabled when no hook is left.
+        """
+        with cls._lock:
+            cls.hooks = tuple(h for h in cls.hooks if h is not hook)
+            cls.enabled = bool(cls.hooks)
+
+    @classmethod
+    def stage(cls, name : str):
+        """
+        Returns a context manager timing a pipeline stage.
+        """
+        return _Stage(name) if cls.enabled else _DISABLED_STAGE
+
+    @classmethod
+    def count(cls, name : str, value : int = 1) -> None:
+        """
+        Increments a counter.
+        """
+        for hook in cls.hooks:
+            hook.on_count(name, value)
+
+    @classmethod
+    def observe(cls, name : str, value : float) -> None:
+        """
+        Records an observed value.
+        """
+        for hook in cls.hooks:
+            hook.on_observe(name, value)
+
+class MetricsRegistry(MetricsHook):
+    """
+    Aggregates the measurements and exposes them in the Prometheus text format.
+
+    Stages and observed values become summaries (count and sum), counters become counters.
+    """
+    PREFIX = 'meal_plan'
+
+    def __init__(self) -> None:
+        self.stages = {}
+        self.counters = {}
+        self.observations = {}
+        self._lock = threading.Lock()
+
+    def on_stage(self, stage : str, start : float, seconds : float) -> None:
+        with self._lock:
+            count, total = self.stages.get(stage, (0, 0.0))
+            self.stages[stage] = (count + 1, total + seconds)
+
+    def on_count(self, name : str, value : int) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def on_observe(self, name : str, value : float) -> None:
+        with self._lock:
+            count, total = self.observations.get(name, (0, 0.0))
+            self.observations[name] = (count + 1, total + value)
+
+    def snapshot(self) -> tuple:
+        """
+        Returns copies of the aggregated stages, counters and observed values, e.g. to send them to another process.
+        """
+        with self._lock:
+            return dict(self.stages), dict(self.counters), dict(self.observations)
+
+    def merge(self, snapshot : tuple) -> None:
+        """
+        Adds the measurements of another registry's snapshot to this one.
+        """
+        stages, counters, observations = snapshot
+        with self._lock:
+            for stage, (count, total) in stages.items():
+                own_count, own_total = self.stages.get(stage, (0, 0.0))
+                self.stages[stage] = (own_count + count, own_total + total)
+            for counter, value in counters.items():
+                self.counters[counter] = self.counters.get(counter, 0) + value
+            for observation, (count, total) in observations.items():
+                own_count, own_total = self.observations.get(observation, (0, 0.0))
+                self.observations[observation] = (own_count + count, own_total + total)
+
+    def prometheus_text(self) -> str:
+        """
+        Returns the aggregated measurements in the Prometheus text exposition format.
+        """
+        stages, counters, observations = self.snapshot()
+        lines = []
+        if stages:
+            name = f'{self.PREFIX}_stage_seconds'
+            lines += [f'# HELP {name} Time spent in each stage of the pipeline.', f'# TYPE {name} summary']
+            for stage, (count, total) in sorted(stages.items()):
+                lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {total:.9f}')
+        for counter, value in sorted(counters.items()):
+            name = f'{self.PREFIX}_{counter}_total'
+            lines += [f'# TYPE {name} counter', f'{name} {value}']
+        for observation, (count, total) in sorted(observations.items()):
+            name = f'{self.PREFIX}_{observation}'
+            lines += [f'# TYPE {name} summary', f'{name}_count {count}', f'{name}_sum {total:g}']
+        return '\n'.join(lines) + '\n'
+
+class TraceRecorder(MetricsHook):
+    """
+    Records every measurement as an event of the Chrome trace format, which chrome://tracing and Perfetto open.
+    """
+    def __init__(self) -> None:
+        self.events = []
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    def _timestamp(self, moment : float = None) -> float:
+        """
+        Returns microseconds since the recorder was created.
+        """
+        return ((moment if moment is not None else time.perf_counter()) - self._origin) * 1e6
+
+    def on_stage(self, stage : str, start : float, seconds : float) -> None:
+        self.events.append({'name': stage, 'ph': 'X', 'ts': self._timestamp(start), 'dur': seconds * 1e6,
+                            'pid': self._pid, 'tid': threading.get_ident()})
+
+    def on_count(self, name : str, value : int) -> None:
+        self.events.append({'name': name, 'ph': 'C', 'ts': self._timestamp(), 'pid': self._pid, 'args': {name: value}})
+
+    def on_observe(self, name : str, value : float) -> None:
+        self.on_count(name, value)
+
+    def dump(self, path : str) -> None:
+        """
+        Writes the recorded events to a JSON trace file.
+        """
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,119 @@
+import time
+
+import numpy as np
+
+from catalog import MealCatalog
+from config import MACRO_TARGETS, CALORIES_PER_MEAL, REPEAT_WINDOW
+
+class MealOptimizer:
+    """
+    Chooses the meals of plans so that every day's carbohydrate, protein and fat split is as close as possible to
+    the target of the customer's MealObjective, without serving the same meal twice within a window of slots.
+
+    Plans sharing a candidate pool are optimized together over the catalog's macro matrix.  A greedy pass fills
+    the slots in order, picking for each plan the meal that keeps its day on target.  The remaining time budget is
+    spent on improvement passes that replace single meals while that lowers the day's error.
+    """
+    repeat_window : int
+    time_budget : float
+    tolerance : float
+
+    def __init__(self, catalog : MealCatalog = None, repeat_window : int = REPEAT_WINDOW, time_budget : float = 0.01, tolerance : float = 1.0) -> None:
+        """
+        Initializes the optimizer.
+        Parameters:
+        - catalog (MealCatalog): The catalog to plan from.  Defaults to the process-wide catalog.
+        - repeat_window (int): Minimum number of slots between two servings of the same meal.
+        - time_budget (float): Seconds per plan to spend on improvement passes after the greedy pass.
+        - tolerance (float): Meals scoring within this many squared percentage points of the best are picked at
+                             random, so plans with the same preferences still vary.
+        """
+        assert repeat_window >= 1, "Repeat window must be at least 1"
+        assert time_budget >= 0, "Time budget must not be negative"
+        self.catalog = catalog if catalog is not None else MealCatalog.get()
+        self.repeat_window = repeat_window
+        self.time_budget = time_budget
+        self.tolerance = tolerance
+
+    def optimize(self, candidates : np.ndarray, num_days : int, meals_per_day : int, objective : str, count : int = 1, rng : np.random.Generator = None) -> np.ndarray:
+        """
+        Chooses the meals of `count` plans drawing from the same candidate pool.
+        Parameters:
+        - candidates (np.ndarray): Catalog positions of the allowed meals.
+        - num_days (int): Number of days of each plan.
+        - meals_per_day (int): Number of meals per day.
+        - objective (str): Name of the MealObjective whose macro target to meet.
+        - count (int): Number of plans to choose.
+        - rng (np.random.Generator): Random generator used to break ties.  A seeded generator gives the same plans
+                                     unless the time budget runs out before the improvement passes converge.
+        Returns:
+        - np.ndarray: Catalog positions of shape (count, num_days * meals_per_day), one row per plan in slot order.
+        """
+        assert len(candidates) > 0, "No candidate meals"
+        rng = rng if rng is not None else np.random.default_rng()
+        num_slots = num_days * meals_per_day
+        macros = self.catalog.macros[candidates].astype(np.float64)
+        squared_norms = (macros ** 2).sum(axis=1)
+        target = np.asarray(MACRO_TARGETS[objective], dtype=np.float64)
+        window = min(self.repeat_window, len(candidates))
+        plans = np.arange(count)
+
+        # ||offset + m||^2 ranks the same as 2 offset.m + ||m||^2, which needs a single matrix product.
+        choices = np.empty((count, num_slots), dtype=np.int64)
+        last_used = np.full((count, len(candidates)), -window, dtype=np.int64)
+        day_sums = np.zeros((count, num_days, 3))
+        for slot in range(num_slots):
+            day, meal = divmod(slot, meals_per_day)
+            offset = day_sums[:, day] - (meal + 1) * target
+            scores = 2 * offset @ macros.T + squared_norms + rng.random((count, len(candidates))) * self.tolerance
+            scores[slot - last_used < window] = np.inf
+            picks = scores.argmin(axis=1)
+            choices[:, slot] = picks
+            last_used[plans, picks] = slot
+            day_sums[:, day] += macros[picks]
+
+        deadline = time.perf_counter() + self.time_budget * count
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for slot in range(num_slots):
+                if time.perf_counter() >= deadline:
+                    break
+                day = slot // meals_per_day
+                current = choices[:, slot]
+                offset = day_sums[:, day] - macros[current] - meals_per_day * target
+                scores = 2 * offset @ macros.T + squared_norms
+                blocked = np.zeros((count, len(candidates)), dtype=bool)
+                blocked[plans[:, None], choices[:, max(0, slot - window + 1):slot + window]] = True
+                blocked[plans, current] = False
+                scores[blocked] = np.inf
+                best = scores.argmin(axis=1)
+                better = scores[plans, best] < scores[plans, current] - max(self.tolerance, 1e-9)
+                if better.any():
+                    day_sums[better, day] += macros[best[better]] - macros[current[better]]
+                    choices[better, slot] = best[better]
+                    improved = True
+
+        return candidates[choices]
+
+    def macro_error(self, positions : np.ndarray, meals_per_day : int, objective : str) -> np.ndarray:
+        """
+        Measures how far each plan's days are from the objective's macro split.
+        Parameters:
+        - positions (np.ndarray): Catalog positions of shape (plans, slots).
+        - meals_per_day (int): Number of meals per day.
+        - objective (str): Name of the MealObjective.
+        Returns:
+        - np.ndarray: Mean absolute deviation of each plan's daily split from the target, in percentage points.
+        """
+        positions = np.atleast_2d(positions)
+        daily = self.catalog.macros[positions].reshape(len(positions), -1, meals_per_day, 3).mean(axis=2)
+        return np.abs(daily - np.asarray(MACRO_TARGETS[objective])).mean(axis=(1, 2))
+
+    @staticmethod
+    def calories_per_meal(objective : str, frequency : str) -> int:
+        """
+        Returns the calories of every meal of an optimized plan: the middle of the objective's and frequency's range.
+        """
+        min_calories_per_meal, max_calories_per_meal = CALORIES_PER_MEAL[(objective, frequency)]
+        return (min_calories_per_meal + max_calories_per_meal) // 2
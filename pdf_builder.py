@@ -0,0 +1,186 @@
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import Metrics
+
+class PDFBuilder:
+    """
+    Builds the PDF documents of meal plans.
+
+    PDFs are cached under the SHA-256 of their LaTeX source, so a document whose source was built before is copied
+    from the cache instead of compiled again.  Sources carry the date they were rendered on, so a document is
+    compiled again on the next day.  Cache misses are compiled by a bounded pool of workers, each in its
+    own temporary directory, so concurrent builds never share intermediate files.  Concurrent builds of the same
+    source wait for a single compilation.
+    """
+    CACHE_DIR = "output/.pdf_cache"
+    OUTPUT_DIR = "output/documents"
+    COMPILERS = (("latexmk", ["--pdf"]), ("pdflatex", []))
+
+    def __init__(self, workers : int = None, cache_dir : str = CACHE_DIR, timeout : float = None) -> None:
+        """
+        Initializes the builder.
+        Parameters:
+        - workers (int): Maximum number of concurrent compilations.  Defaults to the number of cores.
+        - cache_dir (str): Directory of the cached PDFs.
+        - timeout (float): Seconds after which a compilation is killed.  No limit by default.
+        """
+        workers = workers if workers is not None else os.cpu_count() or 1
+        assert workers >= 1, "Workers must be at least 1"
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pdflatex')
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+    def shutdown(self, wait : bool = True) -> None:
+        """
+        Stops the workers, waiting for the pending builds unless told otherwise.
+        """
+        self._executor.shutdown(wait=wait)
+
+    @classmethod
+    def output_path(cls, customer, output_dir : str = OUTPUT_DIR) -> str:
+        """
+        Returns the path, without extension, of a customer's document.
+        """
+        return os.path.join(output_dir, customer.file_stem())
+
+    def submit(self, meal_plan, filepath : str) -> Future:
+        """
+        Renders the meal plan's document and builds it in the background.
+        Parameters:
+        - meal_plan (MealPlan): The meal plan to build the document of.
+        - filepath (str): The path of the document, without extension.  The LaTeX source is kept next to the PDF.
+        Returns:
+        - Future: Resolves to the path of the PDF.
+        """
+        from document_generator import DocumentGenerator
+
+        buffer = io.StringIO()
+        DocumentGenerator.write_tex(meal_plan, buffer)
+        return self.submit_tex(buffer.getvalue(), filepath)
+
+    def submit_tex(self, tex : str, filepath : str) -> Future:
+        """
+        Builds a LaTeX source in the background.
+        Parameters:
+        - tex (str): The LaTeX source.
+        - filepath (str): The path of the document, without extension.
+        Returns:
+        - Future: Resolves to the path of the PDF.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        with open(filepath + '.tex', 'w', encoding='utf-8') as f:
+            f.write(tex)
+
+        source = tex.encode('utf-8')
+        digest = hashlib.sha256(source).hexdigest()
+        cached = self.cached_pdf(digest)
+        if cached is not None:
+            Metrics.count('pdf_cache_hits')
+            future = Future()
+            future.set_result(self._copy(cached, filepath + '.pdf'))
+            return future
+
+        with self._lock:
+            build = self._pending.get(digest)
+            if build is None:
+                build = self._executor.submit(self._compile, source, digest)
+                self._pending[digest] = build
+                build.add_done_callback(lambda _: self._forget(digest))
+
+        future = Future()
+        def deliver(build : Future) -> None:
+            try:
+                future.set_result(self._copy(build.result(), filepath + '.pdf'))
+            except Exception as e:
+                future.set_exception(e)
+        build.add_done_callback(deliver)
+        return future
+
+    def build_files(self, filepaths : list) -> list:
+        """
+        Builds existing LaTeX sources, all cores at once, and waits for them.
+        Parameters:
+        - filepaths (list): Paths of the .tex files, without extension.
+        Returns:
+        - list: The path of each PDF, or the exception its build raised.
+        """
+        futures = []
+        for filepath in filepaths:
+            with open(filepath + '.tex', encoding='utf-8') as f:
+                futures.append(self.submit_tex(f.read(), filepath))
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def cached_pdf(self, digest : str) -> str:
+        """
+        Returns the path of the cached PDF of a source hash, or None.
+        """
+        path = os.path.join(self.cache_dir, digest + '.pdf')
+        return path if os.path.exists(path) else None
+
+    def _forget(self, digest : str) -> None:
+        with self._lock:
+            self._pending.pop(digest, None)
+
+    def _compile(self, source : bytes, digest : str) -> str:
+        """
+        Compiles a LaTeX source in a temporary directory and stores the PDF in the cache.  Runs in a worker.
+        Returns:
+        - str: The path of the cached PDF.
+        Raises:
+        - FileNotFoundError: If no LaTeX compiler is installed.
+        - subprocess.CalledProcessError: If the compilation failed.
+        - subprocess.TimeoutExpired: If the compilation took longer than the timeout.
+        """
+        with Metrics.stage('pdf_compile'), tempfile.TemporaryDirectory(prefix='meal_plan_') as build_dir:
+            with open(os.path.join(build_dir, 'document.tex'), 'wb') as f:
+                f.write(source)
+            for compiler, arguments in self.COMPILERS:
+                try:
+                    subprocess.run([compiler, *arguments, '--interaction=nonstopmode', 'document.tex'],
+                                   cwd=build_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, check=True, timeout=self.timeout)
+                    break
+                except FileNotFoundError:
+                    continue
+            else:
+                raise FileNotFoundError("No LaTeX compiler found.  Install latexmk or pdflatex.")
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            return self._copy(os.path.join(build_dir, 'document.pdf'), os.path.join(self.cache_dir, digest + '.pdf'))
+
+    @staticmethod
+    def _copy(source : str, destination : str) -> str:
+        """
+        Copies a file so that readers of the destination never see it half-written.
+        """
+        directory = os.path.dirname(os.path.abspath(destination))
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix='.part')
+        os.close(fd)
+        try:
+            shutil.copyfile(source, temporary)
+            os.replace(temporary, destination)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        return destination
@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Plan columns and the store columns holding them.  Meal columns are stored once per SKU in the meals table.
+MEAL_COLUMNS = {
+    'SKU': 'sku',
+    'Meal': 'meal',
+    'Type': 'type',
+    'Main Ingredient': 'main_ingredient',
+    'Carbohydrate (%)': 'carbohydrate_pct',
+    'Protein (%)': 'protein_pct',
+    'Fat (%)': 'fat_pct',
+}
+PLAN_COLUMNS = {
+    'Customer': 'customer',
+    'Date': 'date',
+    'SKU': 'sku',
+    'Calories': 'calories',
+    'Carbohydrates (g)': 'carbohydrates_g',
+    'Protein (g)': 'protein_g',
+    'Fat (g)': 'fat_g',
+}
+INSERT_BATCH_SIZE = 10_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meals (
+    sku TEXT PRIMARY KEY,
+    meal TEXT,
+    type TEXT,
+    main_ingredient TEXT,
+    carbohydrate_pct REAL,
+    protein_pct REAL,
+    fat_pct REAL
+);
+CREATE TABLE IF NOT EXISTS plan_meals (
+    customer TEXT NOT NULL,
+    date INTEGER NOT NULL,
+    sku TEXT NOT NULL,
+    calories INTEGER,
+    carbohydrates_g REAL,
+    protein_g REAL,
+    fat_g REAL
+);
+CREATE INDEX IF NOT EXISTS plan_meals_customer ON plan_meals (customer, date);
+CREATE INDEX IF NOT EXISTS plan_meals_date ON plan_meals (date);
+CREATE INDEX IF NOT EXISTS plan_meals_sku ON plan_meals (sku, date);
+"""
+
+class PlanStore:
+    """
+    A SQLite database of meal plans, to keep the plans of every customer and query them.
+
+    Plans are stored one row per meal in plan_meals, with the meal time as Unix seconds, and the catalog columns
+    once per SKU in meals.  Indexes on (customer, date), (date) and (sku, date) answer the plan of a customer, the
+    meals of a date and the servings of a SKU in milliseconds with millions of rows.
+
+    The database runs in WAL mode, so readers never block the writer.  Several processes, such as batch workers,
+    can write to the same store: each write is one transaction, and a writer waits up to the timeout for the
+    others to finish.  Saving the plan of a customer replaces the plan stored before.
+    """
+    PATH = "output/plans.sqlite"
+
+    def __init__(self, path : str = PATH, timeout : float = 60) -> None:
+        """
+        Opens the store, creating it if needed.
+        Parameters:
+        - path (str): Path of the database file.
+        - timeout (float): Seconds a writer waits for the other writers before failing.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # Transactions are begun explicitly, so the connection runs in autocommit mode.
+        self._connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute(f'PRAGMA busy_timeout={int(timeout * 1000)}')
+            self._connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the connection.
+        """
+        self._connection.close()
+
+    def save(self, plans : pd.DataFrame) -> int:
+        """
+        Stores plans, replacing the plans stored before for the same customers.
+        Parameters:
+        - plans (pandas.DataFrame): Plan rows with the 'Customer' column, as written by batch.py.
+        Returns:
+        - int: The number of meals stored.
+        """
+        assert 'Customer' in plans, "Plans must have a 'Customer' column"
+        meals = plans[list(MEAL_COLUMNS)].drop_duplicates('SKU')
+        dates = pd.to_datetime(plans['Date']).to_numpy().astype('datetime64[s]').astype(np.int64)
+        columns = [plans[column].tolist() if column != 'Date' else dates.tolist() for column in PLAN_COLUMNS]
+        customers = [(customer,) for customer in pd.unique(plans['Customer'])]
+
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                self._connection.executemany('DELETE FROM plan_meals WHERE customer = ?', customers)
+                self._connection.executemany(
+                    f"INSERT OR REPLACE INTO meals ({', '.join(MEAL_COLUMNS.values())}) VALUES ({', '.join('?' * len(MEAL_COLUMNS))})",
+                    zip(*(meals[column].tolist() for column in MEAL_COLUMNS)))
+                insert = f"INSERT INTO plan_meals ({', '.join(PLAN_COLUMNS.values())}) VALUES ({', '.join('?' * len(PLAN_COLUMNS))})"
+                for start in range(0, len(plans), INSERT_BATCH_SIZE):
+                    self._connection.executemany(insert, zip(*(column[start:start + INSERT_BATCH_SIZE] for column in columns)))
+                self._connection.execute('COMMIT')
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+        return len(plans)
+
+    def save_plan(self, meal_plan) -> int:
+        """
+        Stores the plan of a MealPlan, replacing the customer's plan stored before.
+        Returns:
+        - int: The number of meals stored.
+        """
+        customer = meal_plan.customer
+        return self.save(meal_plan.meals_list.assign(Customer=customer.customer_id or customer.profile['name']))
+
+    def customer_plan(self, customer_id : str) -> pd.DataFrame:
+        """
+        Returns the stored plan of a customer, with the columns of MealPlan.meals_list.
+        """
+        plan = self._query('p.customer = ?', 'p.date', (customer_id,))
+        return plan.drop(columns='Customer')
+
+    def meals_on(self, date) -> pd.DataFrame:
+        """
+        Returns every meal scheduled on a date, by customer.
+        Parameters:
+        - date (datetime): The date.  Its time of day is ignored.
+        """
+        start = self._timestamp(datetime(date.year, date.month, date.day))
+        return self._query('p.date >= ? AND p.date < ?', 'p.customer, p.date', (start, start + 86400))
+
+    def sku_meals(self, sku : str, first : datetime = None, last : datetime = None) -> pd.DataFrame:
+        """
+        Returns every stored serving of a SKU, in chronological order.
+        Parameters:
+        - sku (str): The SKU.
+        - first (datetime): If given, only servings on or after this date.
+        - last (datetime): If given, only servings on or before this date.
+        """
+        start = self._timestamp(datetime(first.year, first.month, first.day)) if first is not None else np.iinfo(np.int64).min
+        end = self._timestamp(datetime(last.year, last.month, last.day) + timedelta(days=1)) if last is not None else np.iinfo(np.int64).max
+        return self._query('p.sku = ? AND p.date >= ? AND p.date < ?', 'p.date, p.customer', (sku, int(start), int(end)))
+
+    def customers(self) -> list:
+        """
+        Returns the ids of the customers with a stored plan.
+        """
+        with self._lock:
+            return [row[0] for row in self._connection.execute('SELECT DISTINCT customer FROM plan_meals ORDER BY customer')]
+
+    def count(self) -> int:
+        """
+        Returns the number of stored meals.
+        """
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM plan_meals').fetchone()[0]
+
+    def iter_meals(self, chunk_size : int = 1_000_000):
+        """
+        Streams the customer, SKU and meal time of every stored meal, e.g. for production counts.  Each chunk is
+        read on its own, so the store can be queried and written to between chunks; meals saved meanwhile may or
+        may not be included.
+        Yields:
+        - pandas.DataFrame: Chunks with the 'Customer', 'SKU' and 'Date' columns.
+        """
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._connection.execute(
+                    'SELECT rowid, customer, sku, date FROM plan_meals WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                    (last, chunk_size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            chunk = pd.DataFrame([row[1:] for row in rows], columns=['Customer', 'SKU', 'Date'])
+            chunk['Date'] = pd.to_datetime(chunk['Date'], unit='s')
+            yield chunk
+
+    def _query(self, condition : str, order : str, parameters : tuple) -> pd.DataFrame:
+        """
+        Returns the stored meals matching a condition on plan_meals (aliased p), sorted, with the plan columns.
+        The meal columns are read once per distinct SKU and joined here, which is faster than a join row by row.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(f'p.{column}' for column in PLAN_COLUMNS.values())} FROM plan_meals p WHERE {condition} ORDER BY {order}",
+                parameters).fetchall()
+            meals = self._connection.execute(
+                f"SELECT {', '.join(MEAL_COLUMNS.values())} FROM meals WHERE sku IN (SELECT DISTINCT p.sku FROM plan_meals p WHERE {condition})",
+                parameters).fetchall()
+        plans = pd.DataFrame(rows, columns=list(PLAN_COLUMNS))
+        meals = pd.DataFrame(meals, columns=list(MEAL_COLUMNS))
+        meals = meals.iloc[pd.Index(meals['SKU']).get_indexer(plans['SKU'])].reset_index(drop=True)
+        plans['Date'] = pd.to_datetime(plans['Date'], unit='s')
+        return pd.concat([plans[['Customer']], meals, plans[['Date', *list(PLAN_COLUMNS)[3:]]]], axis=1)
+
+    @staticmethod
+    def _timestamp(moment : datetime) -> int:
+        """
+        Returns the Unix seconds of a naive datetime, as stored in the date column.
+        """
+        return int(np.datetime64(moment, 's').astype(np.int64))
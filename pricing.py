@@ -0,0 +1,252 @@
+import json
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from catalog import MealCatalog
+from config import MealType, PRICE_PER_MEAL
+from metrics import Metrics
+
+class PriceTable:
+    """
+    The prices of the meals and the discounts of the subscriptions.
+
+    A meal costs the price of its SKU if the table sets one, and the price of its MealType otherwise.  A plan gets
+    the best of its duration discount, by number of days, and its volume discount, by number of meals.
+
+    The table is read from datasets/prices.json, next to the meal dataset, when it exists:
+        {"types": {"KETO": 1000}, "skus": {"K001": 1200},
+         "duration_discounts": {"20": 0.05, "60": 0.1}, "volume_discounts": {"100": 0.05}}
+    Every key is optional.  Meal types without a price in the file keep the price of PRICE_PER_MEAL, and there are
+    no discounts by default.
+
+    Plans are priced from their catalog positions: the price of every catalog meal is resolved once per catalog into
+    an array, and the plans of a whole batch are priced with one lookup and a few bincounts over it.
+    """
+    PATH = "datasets/prices.json"
+
+    type_prices : dict
+    sku_prices : dict
+    duration_discounts : dict
+    volume_discounts : dict
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, type_prices : dict = None, sku_prices : dict = None, duration_discounts : dict = None, volume_discounts : dict = None) -> None:
+        """
+        Initializes the table.
+        Parameters:
+        - type_prices (dict): Price of a meal by MealType name.  Defaults to PRICE_PER_MEAL.
+        - sku_prices (dict): Price of a meal by SKU, overriding the price of its type.
+        - duration_discounts (dict): Discount rate, e.g. 0.05, by minimum number of days of the plan.
+        - volume_discounts (dict): Discount rate by minimum number of meals of the plan.
+        """
+        self.type_prices = dict(type_prices if type_prices is not None else PRICE_PER_MEAL)
+        self.sku_prices = dict(sku_prices or {})
+        self.duration_discounts = {int(days): float(rate) for days, rate in (duration_discounts or {}).items()}
+        self.volume_discounts = {int(meals): float(rate) for meals, rate in (volume_discounts or {}).items()}
+        for meal_type in self.type_prices:
+            assert meal_type in MealType.__members__, f"Unknown meal type {meal_type}"
+        for rate in (*self.duration_discounts.values(), *self.volume_discounts.values()):
+            assert 0 <= rate < 1, f"Discount rates must be between 0 and 1, got {rate}"
+        self._meal_prices = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls) -> "PriceTable":
+        """
+        Returns the process-wide price table, loading it on first use.
+        """
+        table = cls._instance
+        if table is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls.load()
+                table = cls._instance
+        return table
+
+    @classmethod
+    def set_instance(cls, table) -> None:
+        """
+        Replaces the process-wide price table.
+        Parameters:
+        - table (PriceTable): The table to share, or None to load it from the price file again on next use.
+        """
+        assert table is None or isinstance(table, PriceTable), f"Expected PriceTable, got {type(table)}"
+        with cls._instance_lock:
+            cls._instance = table
+
+    @classmethod
+    def load(cls, path : str = PATH) -> "PriceTable":
+        """
+        Reads a price table from a JSON file.
+        Parameters:
+        - path (str): Path of the price file.  The default prices are used if it does not exist.
+        Returns:
+        - PriceTable: The price table.
+        """
+        try:
+            with open(path) as f:
+                content = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        assert isinstance(content, dict), f"{path} must hold a JSON object"
+        type_prices = {**PRICE_PER_MEAL, **content.get('types', {})}
+        return cls(type_prices, content.get('skus'), content.get('duration_discounts'), content.get('volume_discounts'))
+
+    def meal_prices(self, catalog : MealCatalog) -> np.ndarray:
+        """
+        Returns the price of every meal of a catalog.
+        Parameters:
+        - catalog (MealCatalog): The catalog.
+        Returns:
+        - np.ndarray: Read-only float64 prices by catalog position, NaN for meals of a type without a price.
+        """
+        prices = self._meal_prices.get(catalog)
+        if prices is None:
+            with self._lock:
+                types = catalog.meals['Type'].cat
+                names = {meal_type.value: meal_type.name for meal_type in MealType}
+                # The last entry prices the meals without a type (code -1).
+                type_prices = np.array([self.type_prices.get(names.get(value), np.nan) for value in types.categories] + [np.nan], dtype=np.float64)
+                prices = type_prices[types.codes.to_numpy()]
+                if self.sku_prices:
+                    # SKUs that are not in the catalog are ignored.
+                    found = pd.Index(catalog.meals['SKU']).get_indexer(list(self.sku_prices))
+                    prices[found[found >= 0]] = np.array(list(self.sku_prices.values()), dtype=np.float64)[found >= 0]
+                prices.flags.writeable = False
+                self._meal_prices[catalog] = prices
+        return prices
+
+    def discount_rates(self, days : np.ndarray, meals : np.ndarray) -> np.ndarray:
+        """
+        Returns the discount rate of plans.
+        Parameters:
+        - days (np.ndarray): The number of days of every plan.
+        - meals (np.ndarray): The number of meals of every plan.
+        Returns:
+        - np.ndarray: The best of the duration and volume discount rates of every plan.
+        """
+        return np.maximum(self._rates(self.duration_discounts, days), self._rates(self.volume_discounts, meals))
+
+    def price_batch(self, batch) -> "PlanPrices":
+        """
+        Prices the plans of a PlanBatch.
+        Returns:
+        - PlanPrices: The price of every plan and of each of its days.
+        """
+        return self.price(batch.catalog, batch.customer_ids, batch.positions, batch.schedules, batch.schedule_ids)
+
+    def price(self, catalog : MealCatalog, customer_ids : list, positions : np.ndarray, schedules : list, schedule_ids : np.ndarray) -> "PlanPrices":
+        """
+        Prices plans stored as in a PlanBatch: the meals of the plans one after the other, at the times of the
+        schedules the plans refer to.
+        Parameters:
+        - catalog (MealCatalog): The catalog the positions point into.
+        - customer_ids (list[str]): The id of every plan's customer.
+        - positions (np.ndarray): The catalog position of every meal.
+        - schedules (list[np.ndarray]): The distinct datetime64 meal schedules of the plans.
+        - schedule_ids (np.ndarray): The index into `schedules` of every plan's schedule.
+        Returns:
+        - PlanPrices: The price of every plan and of each of its days.
+        """
+        with Metrics.stage('pricing'):
+            schedule_ids = np.asarray(schedule_ids)
+            # The day of every slot of each schedule, counted from the schedule's first day.
+            days = [np.asarray(schedule).astype('datetime64[D]') for schedule in schedules]
+            day_numbers = [np.concatenate(([0], np.cumsum(d[1:] != d[:-1]))) if len(d) else np.zeros(0, dtype=np.int64) for d in days]
+            day_dates = [d[np.concatenate(([True], d[1:] != d[:-1]))] if len(d) else d for d in days]
+            schedule_meals = np.array([len(d) for d in days], dtype=np.int64)
+            schedule_days = np.array([len(d) for d in day_dates], dtype=np.int64)
+
+            plan_meals = schedule_meals[schedule_ids]
+            plan_days = schedule_days[schedule_ids]
+            day_offsets = np.concatenate(([0], np.cumsum(plan_days)))
+            meal_days = np.repeat(day_offsets[:-1], plan_meals)
+            if len(schedule_ids):
+                meal_days += np.concatenate([day_numbers[i] for i in schedule_ids])
+
+            meal_prices = self.meal_prices(catalog)[positions]
+            if np.isnan(meal_prices).any():
+                missing = pd.unique(catalog.meals['Type'].iloc[np.asarray(positions)[np.isnan(meal_prices)]].astype(str))
+                raise ValueError(f"No price for the meal types {', '.join(missing)}")
+            day_subtotals = np.bincount(meal_days, weights=meal_prices, minlength=day_offsets[-1])
+            subtotals = np.bincount(np.repeat(np.arange(len(schedule_ids)), plan_days), weights=day_subtotals, minlength=len(schedule_ids))
+            rates = self.discount_rates(plan_days, plan_meals)
+            day_totals = np.round(day_subtotals * np.repeat(1 - rates, plan_days), 2)
+            totals = np.round(subtotals * (1 - rates), 2)
+            Metrics.count('plans_priced', len(schedule_ids))
+        return PlanPrices(customer_ids, plan_meals, plan_days, subtotals, rates, totals, day_offsets,
+                          [day_dates[i] for i in schedule_ids], day_subtotals, day_totals)
+
+    @staticmethod
+    def _rates(discounts : dict, amounts : np.ndarray) -> np.ndarray:
+        """
+        Returns the best discount rate reached by each amount in a table of rates by minimum amount.
+        """
+        if not discounts:
+            return np.zeros(len(amounts))
+        thresholds = np.array(sorted(discounts))
+        rates = np.maximum.accumulate([0.0] + [discounts[threshold] for threshold in thresholds])
+        return rates[np.searchsorted(thresholds, amounts, side='right')]
+
+class PlanPrices:
+    """
+    The prices of plans, by plan and by day.  The total of a day is its share of the discounted plan, rounded to
+    the centavo, so the days of a plan can add up to a centavo or so more or less than the plan's total.
+    """
+    customer_ids : list
+    meals : np.ndarray
+    days : np.ndarray
+    subtotals : np.ndarray
+    discount_rates : np.ndarray
+    totals : np.ndarray
+
+    def __init__(self, customer_ids : list, meals : np.ndarray, days : np.ndarray, subtotals : np.ndarray, discount_rates : np.ndarray, totals : np.ndarray,
+                 day_offsets : np.ndarray, day_dates : list, day_subtotals : np.ndarray, day_totals : np.ndarray) -> None:
+        """
+        Initializes the prices.  The days of plan i are those between day_offsets[i] and day_offsets[i + 1].
+        """
+        self.customer_ids = customer_ids
+        self.meals = meals
+        self.days = days
+        self.subtotals = subtotals
+        self.discount_rates = discount_rates
+        self.totals = totals
+        self.day_offsets = day_offsets
+        self.day_dates = day_dates
+        self.day_subtotals = day_subtotals
+        self.day_totals = day_totals
+
+    def __len__(self) -> int:
+        """
+        Returns the number of plans.
+        """
+        return len(self.totals)
+
+    def plans(self) -> pd.DataFrame:
+        """
+        Returns one row per plan with its 'Customer', number of 'Meals' and 'Days', 'Subtotal', 'Discount (%)' and 'Total'.
+        """
+        return pd.DataFrame({
+            'Customer': self.customer_ids,
+            'Meals': self.meals,
+            'Days': self.days,
+            'Subtotal': self.subtotals,
+            'Discount (%)': self.discount_rates * 100,
+            'Total': self.totals,
+        })
+
+    def by_day(self) -> pd.DataFrame:
+        """
+        Returns one row per day of every plan with its 'Customer', 'Date', 'Subtotal' and 'Total'.
+        """
+        return pd.DataFrame({
+            'Customer': np.repeat(np.asarray(self.customer_ids, dtype=object), self.days),
+            'Date': np.concatenate(self.day_dates) if self.day_dates else np.array([], dtype='datetime64[D]'),
+            'Subtotal': self.day_subtotals,
+            'Total': self.day_totals,
+        })
@@ -0,0 +1,288 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from catalog import MealCatalog
+from config import bcolors, MEAL_TIMES
+from exporters import export_format
+
+# Every meal time of any frequency, in the order of the day.
+SLOTS = tuple(sorted({time for times in MEAL_TIMES.values() for time in times}))
+READ_CHUNK_SIZE = 1_000_000
+
+class ProductionCounts:
+    """
+    The number of servings of every SKU to cook for every date and meal slot, summed over any number of plans.
+
+    Counts are held in a dense int32 array of shape (days, SKUs, slots) covering the dates seen so far, so memory
+    depends on the catalog and the span of dates, never on the number of plans.  Plans are added chunk by chunk
+    with one bincount per chunk.  Counts can be saved and loaded again to add the plans of new subscriptions, or
+    to remove cancelled ones.
+    """
+    catalog : MealCatalog
+    counts : np.ndarray
+    start : np.datetime64
+
+    def __init__(self, catalog : MealCatalog = None) -> None:
+        """
+        Initializes empty counts.
+        Parameters:
+        - catalog (MealCatalog): The catalog of the planned meals.  Defaults to the process-wide catalog.
+        """
+        self.catalog = catalog if catalog is not None else MealCatalog.get()
+        self._skus = pd.Index(self.catalog.meals['SKU'])
+        self._slot_minutes = np.array([int(slot[:2]) * 60 + int(slot[3:]) for slot in SLOTS])
+        self.counts = np.zeros((0, len(self._skus), len(SLOTS)), dtype=np.int32)
+        self.start = None
+
+    @property
+    def dates(self) -> np.ndarray:
+        """
+        The dates with any serving, as datetime64[D].
+        """
+        days = np.flatnonzero(self.counts.any(axis=(1, 2)))
+        return self.start + days.astype('timedelta64[D]') if len(days) else np.array([], dtype='datetime64[D]')
+
+    @property
+    def total(self) -> int:
+        """
+        The number of servings counted.
+        """
+        return int(self.counts.sum(dtype=np.int64))
+
+    def add(self, plans : pd.DataFrame) -> None:
+        """
+        Adds the meals of plans, e.g. a chunk of a batch output.
+        Parameters:
+        - plans (pandas.DataFrame): Plan rows with at least the 'SKU' and 'Date' columns.
+        Raises:
+        - ValueError: If a SKU is not in the catalog or a meal is not at a slot's time.
+        """
+        self._count(self._positions(plans['SKU']), pd.to_datetime(plans['Date']).to_numpy(), 1)
+
+    def remove(self, plans : pd.DataFrame) -> None:
+        """
+        Removes the meals of plans added before, e.g. of a cancelled subscription.
+        """
+        self._count(self._positions(plans['SKU']), pd.to_datetime(plans['Date']).to_numpy(), -1)
+
+    def add_meals(self, positions : np.ndarray, dates : np.ndarray) -> None:
+        """
+        Adds meals given by catalog position, such as those of a MealPlan or a PlanBatch.
+        Parameters:
+        - positions (np.ndarray): Catalog positions of the meals.
+        - dates (np.ndarray): The datetime64 meal time of every meal.
+        """
+        self._count(np.asarray(positions), np.asarray(dates), 1)
+
+    def prep_sheet(self, date) -> pd.DataFrame:
+        """
+        Returns the prep sheet of a date: the servings of every SKU to cook, by slot.
+        Parameters:
+        - date: The date, as anything numpy.datetime64 accepts.
+        Returns:
+        - pandas.DataFrame: One row per SKU with servings, in catalog order, with the 'SKU', 'Meal' and
+                            'Main Ingredient' columns, a column per slot and a 'Total' column.
+        """
+        day = np.datetime64(date, 'D')
+        index = (day - self.start).astype(int) if self.start is not None else -1
+        counts = self.counts[index] if 0 <= index < len(self.counts) else np.zeros(self.counts.shape[1:], dtype=np.int32)
+        totals = counts.sum(axis=1)
+        rows = np.flatnonzero(totals)
+        sheet = self.catalog.meals.iloc[rows][['SKU', 'Meal', 'Main Ingredient']].reset_index(drop=True)
+        used = counts[rows].any(axis=0)
+        for slot, column in zip(np.array(SLOTS)[used], counts[rows][:, used].T):
+            sheet[slot] = column
+        sheet['Total'] = totals[rows]
+        return sheet
+
+    def prep_sheets(self, first=None, last=None):
+        """
+        Yields the prep sheet of every date with servings.
+        Parameters:
+        - first: The first date to yield, if not the first with servings.
+        - last: The last date to yield, if not the last with servings.
+        Yields:
+        - tuple: The date as datetime64[D] and its prep sheet.
+        """
+        for day in self.dates:
+            if (first is None or day >= np.datetime64(first, 'D')) and (last is None or day <= np.datetime64(last, 'D')):
+                yield day, self.prep_sheet(day)
+
+    def ingredient_rollup(self) -> pd.DataFrame:
+        """
+        Returns the servings of every main ingredient on every date with servings.
+        Returns:
+        - pandas.DataFrame: One row per date, indexed by 'Date', with a column per main ingredient.
+        """
+        ingredients = self.catalog.meals['Main Ingredient'].astype('category')
+        codes = ingredients.cat.codes.to_numpy()
+        per_sku = self.counts.sum(axis=2, dtype=np.int64)
+        rollup = np.stack([per_sku[:, codes == code].sum(axis=1) for code in range(len(ingredients.cat.categories))], axis=1)
+        days = np.flatnonzero(per_sku.any(axis=1))
+        return pd.DataFrame(rollup[days], columns=list(ingredients.cat.categories),
+                            index=pd.Index(self.start + days.astype('timedelta64[D]') if len(days) else days.astype('datetime64[D]'), name='Date'))
+
+    def save(self, path : str) -> None:
+        """
+        Saves the counts, with the SKUs and slots they refer to.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        start = self.start if self.start is not None else np.datetime64('NaT', 'D')
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, counts=self.counts, start=start, skus=self._skus.to_numpy(dtype=str), slots=np.array(SLOTS))
+
+    @classmethod
+    def load(cls, path : str, catalog : MealCatalog = None) -> "ProductionCounts":
+        """
+        Loads counts saved before.  SKUs are matched by name, so the catalog may have changed in between.
+        Raises:
+        - ValueError: If a counted SKU is no longer in the catalog.
+        """
+        production = cls(catalog)
+        with np.load(path) as saved:
+            counts, start, skus, slots = saved['counts'], saved['start'], saved['skus'], saved['slots']
+        assert tuple(slots) == SLOTS, f"Saved slots {tuple(slots)} do not match {SLOTS}"
+        if len(counts):
+            counted = counts.any(axis=(0, 2))
+            positions = production._positions(pd.Series(skus[counted]))
+            production.counts = np.zeros((len(counts), len(production._skus), len(SLOTS)), dtype=np.int32)
+            production.counts[:, positions] = counts[:, counted]
+            production.start = start[()]
+        return production
+
+    def _positions(self, skus : pd.Series) -> np.ndarray:
+        """
+        Returns the catalog positions of SKUs.
+        """
+        positions = self._skus.get_indexer(skus)
+        if (positions < 0).any():
+            raise ValueError(f"SKU {skus.to_numpy()[positions < 0][0]} is not in the catalog")
+        return positions
+
+    def _count(self, positions : np.ndarray, dates : np.ndarray, sign : int) -> None:
+        """
+        Adds `sign` servings per meal.
+        """
+        if not len(positions):
+            return
+        minutes = dates.astype('datetime64[m]')
+        days = minutes.astype('datetime64[D]')
+        slots = np.searchsorted(self._slot_minutes, (minutes - days).astype(int))
+        if ((slots >= len(SLOTS)) | (self._slot_minutes[np.minimum(slots, len(SLOTS) - 1)] != (minutes - days).astype(int))).any():
+            raise ValueError(f"Meals must be served at one of the slots {', '.join(SLOTS)}")
+
+        self._cover(days.min(), days.max())
+        num_skus = self.counts.shape[1]
+        cells = ((days - self.start).astype(np.int64) * num_skus + positions) * len(SLOTS) + slots
+        low = cells.min()
+        counts = self.counts.reshape(-1)
+        added = np.bincount(cells - low)
+        counts[low:low + len(added)] += (sign * added).astype(np.int32)
+
+    def _cover(self, first : np.datetime64, last : np.datetime64) -> None:
+        """
+        Grows the counts to cover the dates from first to last.  Growth doubles the span, so that streaming
+        chronological plans reallocates only a logarithmic number of times.
+        """
+        if self.start is None:
+            self.start = first
+        covered = self.start + np.timedelta64(len(self.counts), 'D')
+        begin = min(self.start, first)
+        end = max(covered, last + np.timedelta64(1, 'D'))
+        if begin == self.start and end == covered:
+            return
+        if end > covered:
+            end = max(end, begin + np.timedelta64(2 * len(self.counts), 'D'))
+        counts = np.zeros(((end - begin).astype(int),) + self.counts.shape[1:], dtype=np.int32)
+        offset = (self.start - begin).astype(int)
+        counts[offset:offset + len(self.counts)] = self.counts
+        self.counts, self.start = counts, begin
+
+def read_plans(path : str, chunk_size : int = READ_CHUNK_SIZE):
+    """
+    Streams the 'SKU' and 'Date' columns of a plans file written by batch.py or MealPlan.save_meal_plan.
+    Parameters:
+    - path (str): The plans file, in any export format, or a plan store.
+    - chunk_size (int): Number of rows per chunk.
+    Yields:
+    - pandas.DataFrame: The rows of each chunk.
+    """
+    columns = ['SKU', 'Date']
+    format = export_format(path)
+    if format == 'csv':
+        yield from pd.read_csv(path, usecols=columns, dtype={'SKU': str}, chunksize=chunk_size)
+    elif format == 'jsonl':
+        for chunk in pd.read_json(path, lines=True, chunksize=chunk_size, dtype={'SKU': str}, convert_dates=False):
+            yield chunk[columns]
+    elif format == 'sqlite':
+        from plan_store import PlanStore
+        with PlanStore(path) as store:
+            for chunk in store.iter_meals(chunk_size):
+                yield chunk[columns]
+    elif format == 'parquet':
+        import pyarrow.parquet
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        import pyarrow
+        import pyarrow.ipc
+        reader = pyarrow.ipc.open_file(pyarrow.memory_map(path))
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).select(columns).to_pandas()
+
+def write_sheets(production : ProductionCounts, output_dir : str, first=None, last=None) -> int:
+    """
+    Writes the prep sheet of every date to prep_<date>.csv and the ingredient rollup to ingredients.csv.
+    Returns:
+    - int: The number of prep sheets written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = 0
+    for day, sheet in production.prep_sheets(first, last):
+        sheet.to_csv(os.path.join(output_dir, f'prep_{day}.csv'), index=False)
+        written += 1
+    rollup = production.ingredient_rollup()
+    if first is not None:
+        rollup = rollup[rollup.index >= np.datetime64(first, 'D')]
+    if last is not None:
+        rollup = rollup[rollup.index <= np.datetime64(last, 'D')]
+    rollup.to_csv(os.path.join(output_dir, 'ingredients.csv'))
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sums the servings of every SKU to cook per date and meal slot over plan files.")
+    parser.add_argument('plans', nargs='+', help="Plan files written by batch.py: .csv, .jsonl, .parquet, .arrow or .sqlite")
+    parser.add_argument('-o', '--output', default='output/production', metavar='DIR', help="Directory of the prep sheets and ingredient rollup")
+    parser.add_argument('--counts', default=None, metavar='FILE', help="Counts file (.npz) to add the plans to, created if missing, for incremental runs")
+    parser.add_argument('--remove', action='store_true', help="Remove the plans from the counts instead, e.g. cancelled subscriptions")
+    parser.add_argument('--from', dest='first', default=None, metavar='DATE', help="First date to write a prep sheet for")
+    parser.add_argument('--to', dest='last', default=None, metavar='DATE', help="Last date to write a prep sheet for")
+    parser.add_argument('--chunk-size', type=int, default=READ_CHUNK_SIZE, help=f"Plan rows read at once (default: {READ_CHUNK_SIZE})")
+    args = parser.parse_args(argv)
+    if args.remove and args.counts is None:
+        parser.error("--remove requires --counts")
+
+    start = time.perf_counter()
+    production = ProductionCounts.load(args.counts) if args.counts is not None and os.path.exists(args.counts) else ProductionCounts()
+    rows = 0
+    for path in args.plans:
+        for plans in read_plans(path, args.chunk_size):
+            if args.remove:
+                production.remove(plans)
+            else:
+                production.add(plans)
+            rows += len(plans)
+    if args.counts is not None:
+        production.save(args.counts)
+    sheets = write_sheets(production, args.output, args.first, args.last)
+    elapsed = time.perf_counter() - start
+
+    print(f"{bcolors.OKGREEN}{rows} meals counted, {sheets} prep sheets saved to {os.path.abspath(args.output)} in {elapsed:.2f}s{bcolors.ENDC}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,70 @@
+import json
+import os
+
 from config import bcolors
 from datetime import datetime
 
 class QuestionnaireUtils:
     """
     A utility class for asking questions in the terminal. Contains various methods for asking questions and validating inputs.
+
+    Answers are read from the terminal, or from a scripted answer source set with set_answers, e.g. to replay
+    sessions from an answer file.
     """
+    answers = None
+
+    @classmethod
+    def set_answers(cls, answers) -> None:
+        """
+        Reads the next answers from an iterable instead of the terminal.
+        Parameters:
+        - answers (iterable): The answers, as they would be typed, in the order of the questions.  None reads from
+                              the terminal again.
+        Example:
+            >>> QuestionnaireUtils.set_answers(["Francis", 25, 1])
+        """
+        cls.answers = iter(answers) if answers is not None else None
+
+    @staticmethod
+    def load_answers(path : str) -> list:
+        """
+        Reads answers from a JSON or YAML answer file, holding either a list of answers or an object with an
+        "answers" list.
+        Parameters:
+        - path (str): Path of the .json, .yaml or .yml file.
+        Returns:
+        - list: The answers.
+        Raises:
+        - ModuleNotFoundError: If the file is YAML and PyYAML is not installed.
+        - ValueError: If the file holds no list of answers.
+        """
+        with open(path) as f:
+            if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+                try:
+                    import yaml
+                except ModuleNotFoundError:
+                    raise ModuleNotFoundError(f"Reading {os.path.basename(path)} requires PyYAML.  Install it with: pip install pyyaml")
+                content = yaml.safe_load(f)
+            else:
+                content = json.load(f)
+        answers = content.get('answers') if isinstance(content, dict) else content
+        if not isinstance(answers, list):
+            raise ValueError(f"Expected a list of answers in {path}")
+        return ['' if answer is None else str(answer) for answer in answers]
+
+    @classmethod
+    def _read_answer(cls) -> str:
+        """
+        Returns the next answer, from the answer source if one is set, else from the terminal.
+        Raises:
+        - EOFError: If the answer source has no answer left, like input() at the end of its input.
+        """
+        if cls.answers is None:
+            return str(input())
+        try:
+            return str(next(cls.answers))
+        except StopIteration:
+            raise EOFError("No scripted answer left")
     
     @staticmethod
     def ask_question(question, return_type : type):
@@ -26,7 +86,7 @@ class QuestionnaireUtils:
         print(question)
         answer = None
         while answer is None:
-            _answer = str(input())
+            _answer = QuestionnaireUtils._read_answer()
             try:
                 answer = return_type(_answer)
             except:
@@ -57,17 +117,13 @@ class QuestionnaireUtils:
                     print(f"{bcolors.OKGREEN}[{i+1}]{bcolors.ENDC} {left_choice:<20} {bcolors.OKGREEN}[{i+1+num_rows}]{bcolors.ENDC} {right_choice}")
 
         choice = None
+        valid_choices = {str(i+1) for i in range(len(choices))}
         
         while choice is None:
             print(f"\n{bcolors.GRAY}Type the number of your choice: {bcolors.ENDC}", end="")
         
-            _choice = str(input())
-            if _choice in [str(i+1) for i in range(len(choices))]:
-                choice = int(_choice)
-            else:
-                print(f"\r{bcolors.FAIL}Invalid input.  Please try again.{bcolors.ENDC}", end="")
-            
-            if _choice in [str(i+1) for i in range(len(choices))]:
+            _choice = QuestionnaireUtils._read_answer()
+            if _choice in valid_choices:
                 choice = int(_choice)
             else:
                 print(f"\r{bcolors.FAIL}Invalid input.  Please try again.{bcolors.ENDC}", end="")
@@ -89,7 +145,7 @@ class QuestionnaireUtils:
         - ValueError: If an invalid date is entered or if the date is not in the future (when future_only is True).
         """
         print(question)
-        months = {month:i  for i, month in enumerate(["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"])}
+        months = {month:i  for i, month in enumerate(["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"], start=1)}
         month = QuestionnaireUtils.ask_multiple_choice_question("Enter the month",months)
         day = QuestionnaireUtils.ask_question("Enter the day", int)
         year = datetime.now().year
@@ -100,7 +156,7 @@ class QuestionnaireUtils:
                 raise ValueError
         except ValueError:
             print(f"{bcolors.FAIL}Invalid date or date must be in the future.  Please try again.{bcolors.ENDC}")
-            date = QuestionnaireUtils.ask_datetime_question(question)
+            date = QuestionnaireUtils.ask_datetime_question(question, future_only)
             
         assert date is not None
         assert type(date) == datetime, f"Expected datetime object, got {type(date)}"
@@ -123,7 +179,7 @@ class QuestionnaireUtils:
 
         selected_choices = []
         while not selected_choices:
-            _choices = list(set(str(input()).split(',')))
+            _choices = list(set(QuestionnaireUtils._read_answer().split(',')))
             if _choices == ['']:
                 selected_choices = []
                 break
@@ -0,0 +1,202 @@
+import numpy as np
+
+from config import REPEAT_WINDOW
+
+class MealSampler:
+    """
+    Samples the meals of plans without repeating a meal within a window of slots.
+
+    Plans are built from shuffled permutation blocks of the candidate pool, so every meal is served once before
+    any meal is served twice.  At each block boundary, the meals served in the last `repeat_window - 1` slots are
+    moved far enough into the next block to keep the window free of repeats.  When the pool is smaller than the
+    window, the window shrinks to the pool size, which is the most variety the pool allows.
+
+    Sampling works on integer position arrays and costs O(plan length) per plan.
+    """
+    repeat_window : int
+
+    def __init__(self, repeat_window : int = REPEAT_WINDOW) -> None:
+        """
+        Initializes the sampler.
+        Parameters:
+        - repeat_window (int): Minimum number of slots between two servings of the same meal.
+        """
+        assert repeat_window >= 1, "Repeat window must be at least 1"
+        self.repeat_window = repeat_window
+
+    def sample(self, candidates : np.ndarray, length : int, count : int = 1, rng : np.random.Generator = None) -> np.ndarray:
+        """
+        Samples `count` plans from the same candidate pool.
+        Parameters:
+        - candidates (np.ndarray): Catalog positions of the allowed meals.
+        - length (int): Number of meal slots of each plan.
+        - count (int): Number of plans to sample.
+        - rng (np.random.Generator): Random generator, for reproducible plans.
+        Returns:
+        - np.ndarray: Catalog positions of shape (count, length), one row per plan in slot order.
+        """
+        assert len(candidates) > 0, "No candidate meals"
+        rng = rng if rng is not None else np.random.default_rng()
+        pool_size = len(candidates)
+        recent_size = self.effective_window(pool_size) - 1
+
+        first = self._distinct(pool_size, min(length, pool_size), count, rng)
+        if length <= pool_size:
+            return candidates[first]
+        rest = self._blocks(pool_size, length - pool_size, count, first[:, pool_size - recent_size:], rng)
+        return candidates[np.concatenate([first, rest], axis=1)]
+
+    def resample(self, positions : np.ndarray, slots, candidates : np.ndarray, rng : np.random.Generator = None) -> np.ndarray:
+        """
+        Replaces the meals of some slots of a plan, e.g. after the customer's allergies changed.  Each new meal is
+        drawn from the candidates not served within the repeat window around its slot, leaving out the meals being
+        replaced.  When every candidate is served around a slot, which can only happen in pools smaller than twice
+        the window, the plan is sampled again from that slot on.
+        Parameters:
+        - positions (np.ndarray): Catalog positions of the plan's meals.
+        - slots (iterable): The slots to replace, in increasing order.
+        - candidates (np.ndarray): Catalog positions of the allowed meals.
+        - rng (np.random.Generator): Random generator, for reproducible plans.
+        Returns:
+        - np.ndarray: A copy of the positions with the slots replaced.
+        """
+        assert len(candidates) > 0, "No candidate meals"
+        rng = rng if rng is not None else np.random.default_rng()
+        positions = positions.copy()
+        recent_size = self.effective_window(len(candidates)) - 1
+        kept = np.ones(len(positions), dtype=bool)
+        kept[list(slots)] = False
+        for slot in slots:
+            nearby = np.arange(max(0, slot - recent_size), min(len(positions), slot + recent_size + 1))
+            allowed = candidates[~np.isin(candidates, positions[nearby[kept[nearby]]])]
+            if len(allowed) == 0:
+                return self.extend(positions[:slot], len(positions), candidates, rng)
+            positions[slot] = rng.choice(allowed)
+            kept[slot] = True
+        return positions
+
+    def extend(self, positions : np.ndarray, length : int, candidates : np.ndarray, rng : np.random.Generator = None) -> np.ndarray:
+        """
+        Appends slots to a plan without changing its existing meals, or truncates it to `length` slots.  The new
+        slots continue the plan's permutation blocks, so they keep the repeat window with the existing meals.
+        Parameters:
+        - positions (np.ndarray): Catalog positions of the plan's meals.
+        - length (int): The new number of slots.
+        - candidates (np.ndarray): Catalog positions of the allowed meals.
+        - rng (np.random.Generator): Random generator, for reproducible plans.
+        Returns:
+        - np.ndarray: Catalog positions of the `length` slots.
+        """
+        if length <= len(positions):
+            return positions[:length].copy()
+        assert len(candidates) > 0, "No candidate meals"
+        rng = rng if rng is not None else np.random.default_rng()
+        recent_size = self.effective_window(len(candidates)) - 1
+        recent = self._recent(positions, candidates, recent_size, rng)
+        added = self._blocks(len(candidates), length - len(positions), 1, recent[None, :], rng)[0]
+        return np.concatenate([positions, candidates[added]])
+
+    def effective_window(self, pool_size : int) -> int:
+        """
+        Returns the repeat window that can be guaranteed for a pool of the given size.
+        """
+        return min(self.repeat_window, pool_size)
+
+    @staticmethod
+    def repeats(positions : np.ndarray, window : int = REPEAT_WINDOW) -> int:
+        """
+        Counts the slots serving a meal that was already served in the previous `window - 1` slots of the same plan.
+        Parameters:
+        - positions (np.ndarray): Catalog positions of shape (plans, slots), or of a single plan.
+        - window (int): The repeat window.
+        """
+        positions = np.atleast_2d(positions)
+        repeated = np.zeros(positions.shape, dtype=bool)
+        for distance in range(1, min(window, positions.shape[1])):
+            repeated[:, distance:] |= positions[:, distance:] == positions[:, :-distance]
+        return int(repeated.sum())
+
+    def _blocks(self, pool_size : int, length : int, count : int, recent : np.ndarray, rng : np.random.Generator) -> np.ndarray:
+        """
+        Draws `length` pool indexes per plan from shuffled permutation blocks, each reordered by _defer_recent
+        against the last slots before it, starting with the `recent` pool indexes of shape (count, window - 1).
+        """
+        recent_size = recent.shape[1]
+        blocks = []
+        sampled = 0
+        while sampled < length:
+            block = rng.permuted(np.tile(np.arange(pool_size), (count, 1)), axis=1)
+            if recent_size > 0:
+                block = self._defer_recent(block, recent, rng)
+                recent = block[:, pool_size - recent_size:]
+            blocks.append(block)
+            sampled += pool_size
+        return np.concatenate(blocks, axis=1)[:, :length]
+
+    @staticmethod
+    def _recent(positions : np.ndarray, candidates : np.ndarray, recent_size : int, rng : np.random.Generator) -> np.ndarray:
+        """
+        Returns the pool indexes of the meals served in the last `recent_size` slots of a plan, oldest first, as
+        _defer_recent expects them.  Slots before the start of the plan, meals outside the pool and earlier servings
+        of a meal served again later hold other pool meals instead, which are then deferred without need.
+        """
+        tail = positions[max(0, len(positions) - recent_size):]
+        served = np.flatnonzero(np.isin(candidates, tail))
+        pool_index = dict(zip(candidates[served], served))
+
+        recent = np.full(recent_size, -1, dtype=np.int64)
+        seen = set()
+        for offset in range(1, len(tail) + 1):
+            meal = tail[-offset]
+            if meal in pool_index and meal not in seen:
+                recent[-offset] = pool_index[meal]
+                seen.add(meal)
+        missing = recent < 0
+        others = np.setdiff1d(np.arange(len(candidates)), recent[~missing])
+        recent[missing] = rng.choice(others, size=int(missing.sum()), replace=False)
+        return recent
+
+    @staticmethod
+    def _distinct(pool_size : int, length : int, count : int, rng : np.random.Generator) -> np.ndarray:
+        """
+        Draws `length` distinct pool indexes per plan.  Small draws from large pools redraw the few duplicates
+        instead of shuffling the whole pool.
+        """
+        if 2 * length > pool_size:
+            return rng.permuted(np.tile(np.arange(pool_size), (count, 1)), axis=1)[:, :length]
+
+        picks = rng.integers(0, pool_size, size=(count, length))
+        while True:
+            order = np.argsort(picks, axis=1, kind='stable')
+            ordered = np.take_along_axis(picks, order, axis=1)
+            repeated = np.zeros(picks.shape, dtype=bool)
+            repeated[:, 1:] = ordered[:, 1:] == ordered[:, :-1]
+            if not repeated.any():
+                return picks
+            duplicates = np.zeros(picks.shape, dtype=bool)
+            np.put_along_axis(duplicates, order, repeated, axis=1)
+            picks[duplicates] = rng.integers(0, pool_size, size=int(duplicates.sum()))
+
+    @staticmethod
+    def _defer_recent(block : np.ndarray, recent : np.ndarray, rng : np.random.Generator) -> np.ndarray:
+        """
+        Reorders a permutation block so that none of the recently served meals comes back too early.
+
+        The other meals keep their shuffled order at keys 0, 1, 2, ...  The recent meals, oldest first, get sorted
+        random keys in (0, fresh count], so the i-th oldest lands at position i + 1 or later, exactly the distance
+        it needs from its previous serving.
+        """
+        count, pool_size = block.shape
+        recent_size = recent.shape[1]
+        plans = np.arange(count)[:, None]
+
+        is_recent = np.zeros(block.shape, dtype=bool)
+        is_recent[plans, recent] = True
+        fresh_order = np.argsort(is_recent[plans, block], axis=1, kind='stable')[:, :pool_size - recent_size]
+        fresh = np.take_along_axis(block, fresh_order, axis=1)
+
+        fresh_keys = np.broadcast_to(np.arange(pool_size - recent_size, dtype=np.float64), fresh.shape)
+        recent_keys = np.sort((pool_size - recent_size) * (1 - rng.random(recent.shape)), axis=1)
+        keys = np.concatenate([fresh_keys, recent_keys], axis=1)
+        values = np.concatenate([fresh, recent], axis=1)
+        return np.take_along_axis(values, np.argsort(keys, axis=1, kind='stable'), axis=1)
@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import json
+import sys
+import traceback
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+from catalog import CatalogWatcher, MealCatalog
+from config import bcolors
+from customer import Customer
+from document_jobs import DocumentJobQueue
+from exporters import round_floats
+from meal_plan import MealPlan
+from metrics import Metrics, MetricsRegistry
+from pricing import PriceTable
+
+MAX_HEADER_COUNT = 100
+MAX_BODY_SIZE = 64 * 1024
+
+class HTTPError(Exception):
+    """
+    An error that is answered with the given HTTP status and message.
+    """
+    def __init__(self, status : HTTPStatus, message : str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class PlanService:
+    """
+    A minimal asyncio HTTP/1.1 server generating meal plans for the storefront.
+
+    Requests are parsed on the event loop while plan generation runs in the loop's default thread pool, so a slow
+    plan never blocks other connections.  Plans are generated from the catalog preloaded at startup, or from the
+    newest process-wide catalog if the service follows it (see CatalogWatcher).  Each request uses a single catalog
+    from start to end, and JSON plans report its version.
+
+    Endpoints:
+    - GET /health: The service status and the catalog version.
+    - POST /plans: Generates a plan for the JSON customer record in the body (see Customer.from_record).  An optional
+      'seed' key makes the plan reproducible.  Returns JSON, or CSV with ?format=csv.
+    - POST /documents: Generates a plan like POST /plans and queues the build of its PDF document.  Answers 202 with
+      the job record right away.
+    - GET /documents/<job id>: The record of a document job, to poll until its status is 'done' or 'failed'.
+    - GET /metrics: Stage timings and counters of the pipeline in the Prometheus text format, if the service was
+      given a metrics registry.
+    """
+    def __init__(self, catalog : MealCatalog = None, jobs : DocumentJobQueue = None, metrics : MetricsRegistry = None) -> None:
+        """
+        Initializes the service with a preloaded catalog.
+        Parameters:
+        - catalog (MealCatalog): The catalog to plan from.  Defaults to the process-wide catalog, as it is when each
+                                 request starts.
+        - jobs (DocumentJobQueue): The queue building the documents.  Defaults to the process-wide queue.
+        - metrics (MetricsRegistry): The registry GET /metrics reports.  The caller adds it as a Metrics hook and
+                                     removes it when the service stops.  Without it, metrics are not collected and
+                                     GET /metrics answers 404.
+        """
+        self._catalog = catalog
+        if catalog is None:
+            MealCatalog.get()
+        self.jobs = jobs if jobs is not None else DocumentJobQueue.get()
+        self.metrics = metrics
+
+    @property
+    def catalog(self) -> MealCatalog:
+        """
+        The catalog to plan the next request from.
+        """
+        return self._catalog if self._catalog is not None else MealCatalog.get()
+
+    async def handle_connection(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
+        """
+        Serves the requests of one keep-alive connection.
+        """
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, target, headers, body = request
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                    status, content_type, payload = await self._dispatch(method, target, body)
+                except HTTPError as e:
+                    status, content_type, payload = e.status, 'application/json', json.dumps({'error': e.message}).encode()
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception:
+                    # A bug must not leave the client without an answer.
+                    print(f"{bcolors.FAIL}ERROR: Unexpected error while serving a request{bcolors.ENDC}", file=sys.stderr, flush=True)
+                    traceback.print_exc()
+                    status, content_type, payload = HTTPStatus.INTERNAL_SERVER_ERROR, 'application/json', json.dumps({'error': "Internal server error"}).encode()
+                    keep_alive = False
+                self._write_response(writer, status, content_type, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader : asyncio.StreamReader):
+        """
+        Reads one request from the connection.
+        Returns:
+        - tuple: The method, target, lower-cased headers and body, or None if the client closed the connection.
+        Raises:
+        - HTTPError: If the request is malformed or too large.
+        """
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADER_COUNT:
+                raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers")
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length < 0 or length > MAX_BODY_SIZE:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Body must be at most {MAX_BODY_SIZE} bytes")
+        body = await reader.readexactly(length) if length else b''
+        return method, target, headers, body
+
+    async def _dispatch(self, method : str, target : str, body : bytes):
+        """
+        Routes a request to its endpoint.
+        Returns:
+        - tuple: The status, content type and payload of the response.
+        """
+        url = urlsplit(target)
+        if url.path == '/health':
+            if method != 'GET':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET")
+            return HTTPStatus.OK, 'application/json', json.dumps({'status': 'ok', 'catalog': self.catalog.version}).encode()
+        if url.path == '/metrics' and self.metrics is not None:
+            if method != 'GET':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET")
+            return HTTPStatus.OK, 'text/plain; version=0.0.4', self.metrics.prometheus_text().encode()
+        if url.path == '/plans':
+            if method != 'POST':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST")
+            output_format = parse_qs(url.query).get('format', ['json'])[0]
+            if output_format not in ('json', 'csv'):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "format must be json or csv")
+            customer, seed = self._parse_customer(body)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.generate, customer, seed, output_format)
+        if url.path == '/documents':
+            if method != 'POST':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST")
+            customer, seed = self._parse_customer(body)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.submit_document, customer, seed)
+        if url.path.startswith('/documents/'):
+            if method != 'GET':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET")
+            try:
+                job = self.jobs.status(url.path.removeprefix('/documents/'))
+            except KeyError:
+                raise HTTPError(HTTPStatus.NOT_FOUND, "Unknown document job")
+            return HTTPStatus.OK, 'application/json', json.dumps(job).encode()
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown path {url.path}")
+
+    @staticmethod
+    def _parse_customer(body : bytes):
+        """
+        Validates the JSON customer record of a plan request.
+        Returns:
+        - tuple: The customer and the requested seed (or None).
+        Raises:
+        - HTTPError: If the body is not a valid customer record.
+        """
+        try:
+            record = json.loads(body)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be JSON")
+        if not isinstance(record, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        seed = record.pop('seed', None)
+        if seed is not None and (not isinstance(seed, int) or seed < 0):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "seed must be a non-negative integer")
+        try:
+            return Customer.from_record(record), seed
+        except (AssertionError, ValueError, TypeError, OverflowError) as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e) or "Invalid customer record")
+
+    def generate(self, customer : Customer, seed : int, output_format : str):
+        """
+        Generates the customer's plan.  Runs in a worker thread.
+        Returns:
+        - tuple: The status, content type and payload of the response.
+        """
+        catalog = self.catalog
+        batch = MealPlan.generate_compact_batch([customer], catalog=catalog, seed=seed)
+        if len(batch.positions) == 0:
+            raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, "Not enough meals in the dataset to generate a meal plan")
+        meals = round_floats(batch.to_frame().drop(columns='Customer'))
+        if output_format == 'csv':
+            return HTTPStatus.OK, 'text/csv', meals.to_csv(index=False).encode()
+        total_cost = float(PriceTable.get().price_batch(batch).totals[0])
+        payload = f'{{"customer": {json.dumps(customer.customer_id)}, "total_cost": {total_cost}, "catalog_version": {json.dumps(catalog.version)}, "meals": {meals.to_json(orient="records", date_format="iso")}}}'
+        return HTTPStatus.OK, 'application/json', payload.encode()
+
+    def submit_document(self, customer : Customer, seed : int):
+        """
+        Generates the customer's plan and queues the build of its document.  Runs in a worker thread.
+        Returns:
+        - tuple: The status, content type and payload of the response.
+        """
+        catalog = self.catalog
+        plans = MealPlan.generate_batch([customer], catalog=catalog, seed=seed)
+        if len(plans) == 0:
+            raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, "Not enough meals in the dataset to generate a meal plan")
+        job_id = self.jobs.submit(MealPlan.from_meals(customer, plans, catalog))
+        return HTTPStatus.ACCEPTED, 'application/json', json.dumps(self.jobs.status(job_id)).encode()
+
+    @staticmethod
+    def _write_response(writer : asyncio.StreamWriter, status : HTTPStatus, content_type : str, payload : bytes, keep_alive : bool) -> None:
+        """
+        Writes an HTTP/1.1 response.
+        """
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode('latin-1') + payload)
+
+async def serve(host : str, port : int, catalog_poll : float = 5.0, metrics : bool = True) -> None:
+    """
+    Preloads the catalog and serves plan requests until cancelled.
+    Parameters:
+    - host (str): Interface to listen on.
+    - port (int): Port to listen on.
+    - catalog_poll (float): Seconds between two checks of the workbook for menu updates, or 0 to never reload it.
+    - metrics (bool): If True, metrics are collected and served on GET /metrics.
+    """
+    registry = Metrics.add_hook(MetricsRegistry()) if metrics else None
+    try:
+        service = PlanService(metrics=registry)
+        if catalog_poll > 0:
+            CatalogWatcher(interval=catalog_poll, on_reload=lambda catalog: print(f"{bcolors.OKGREEN}Meal catalog reloaded: {catalog.version}{bcolors.ENDC}", flush=True)).start()
+        server = await asyncio.start_server(service.handle_connection, host, port)
+        host, port = server.sockets[0].getsockname()[:2]
+        print(f"{bcolors.OKGREEN}Serving meal plans on http://{host}:{port}{bcolors.ENDC}", flush=True)
+        async with server:
+            await server.serve_forever()
+    finally:
+        if registry is not None:
+            Metrics.remove_hook(registry)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serves meal plans over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="Port to listen on, 0 for any free port (default: 8080)")
+    parser.add_argument('--catalog-poll', type=float, default=5.0, metavar='SECONDS', help="Seconds between checks of the meal dataset for updates, 0 to never reload it (default: 5)")
+    parser.add_argument('--no-metrics', action='store_true', help="Do not collect metrics nor serve GET /metrics")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.catalog_poll, metrics=not args.no_metrics))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()